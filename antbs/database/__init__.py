@@ -28,20 +28,32 @@
 
 
 from .base_objects import (
+    ROLE,
     db,
+    pubsub_db,
+    binary_db,
     RedisHash,
     RedisList,
     RedisZSet,
     RedisHashMCS,
     RedisSingleton,
+    RedisDataRedisObject,
     Singleton,
     bool_string_helper
 )
 
-from .status import status, get_timeline_object
-from .build import get_build_object
-from .package import get_pkg_object
+from .identity_map import identity_map_scope, job_identity_map
+from .status import status, get_timeline_object, get_timeline_objects
+from .build import get_build_object, get_build_objects
+from .package import get_pkg_object, get_pkg_objects
 from .repo import get_repo_object
-from .transaction import get_trans_object
+from .transaction import (
+    get_trans_object,
+    queue_transaction,
+    claim_next_transaction,
+    clear_transaction_queue,
+    get_transaction_wait_stats
+)
 from .monitor import get_monitor_object, check_repos_for_changes
 from .installation import AntergosInstallation, AntergosInstallationUser
+from .live_output_hub import LiveOutputHub
@@ -28,8 +28,12 @@
 
 from utils.utility_classes import Singleton
 
+from ._redis_connection import ROLE
+
 from ._redis_data import (
     db,
+    pubsub_db,
+    binary_db,
     RedisDataHashField,
     RedisDataRedisObject,
     bool_string_helper
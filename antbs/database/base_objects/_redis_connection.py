@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# _redis_connection.py
+#
+# Copyright © 2013-2017 Antergos
+#
+# This file is part of The Antergos Build Server, (AntBS).
+#
+# AntBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# AntBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# The following additional terms are in effect as per Section 7 of the license:
+#
+# The preservation of all legal notices and author attributions in
+# the material or in the Appropriate Legal Notices displayed
+# by works containing it is required.
+#
+# You should have received a copy of the GNU General Public License
+# along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Redis connection factory. Connections are configured with environment variables:
+
+    ANTBS_PROCESS_ROLE:                  `web`, `transaction` or `repo`. Selects the default
+                                         pool sizes for the process (default: `web`).
+    ANTBS_REDIS_URL:                     A `redis://`, `rediss://` or `unix://` url for the
+                                         server (default: unix:///var/run/redis/redis.sock).
+    ANTBS_REDIS_MAX_CONNECTIONS:         Size of the pool for commands.
+    ANTBS_REDIS_PUBSUB_MAX_CONNECTIONS:  Size of the pool for pub/sub subscribers.
+    ANTBS_REDIS_POOL_TIMEOUT:            Seconds to wait for a free connection (default: 20).
+    ANTBS_REDIS_SOCKET_TIMEOUT:          Seconds to wait for a command's reply (default: none).
+    ANTBS_REDIS_CONNECT_TIMEOUT:         Seconds to wait for a TCP connection (default: 5).
+
+Pub/sub subscribers (eg. SSE clients) hold their connection for as long as they are subscribed
+and block while waiting for messages, so they get a pool of their own. This ensures they can
+never starve regular commands of connections. Replies are parsed with hiredis when it is
+installed.
+
+Replies are decoded to `str` except on binary clients (see `create_client`), which are used
+for binary data such as compressed build logs.
+
+"""
+
+import os
+
+import redis
+
+# This is `HiredisParser` when the hiredis package is installed, `PythonParser` otherwise.
+from redis.connection import DefaultParser
+
+DEFAULT_URL = 'unix:///var/run/redis/redis.sock'
+
+# Pool sizes (commands, pubsub) for each process role.
+POOL_SIZES = {
+    'web': (64, 256),
+    'transaction': (16, 8),
+    'repo': (8, 4),
+}
+
+ROLE = os.environ.get('ANTBS_PROCESS_ROLE', 'web')
+
+if ROLE not in POOL_SIZES:
+    raise ValueError('ANTBS_PROCESS_ROLE must be one of {0}'.format(list(POOL_SIZES)))
+
+
+def _get_env_number(name, default, number_type=int):
+    value = os.environ.get(name, '')
+
+    return number_type(value) if value else default
+
+
+def create_connection_pool(pubsub=False, binary=False):
+    """
+    Creates a connection pool for this process' role.
+
+    Args:
+        pubsub (bool): Create the pool for pub/sub subscribers. Their connections have no
+                       socket timeout because they block while waiting for messages.
+        binary (bool): Don't decode replies (they will be `bytes`).
+
+    Returns:
+        redis.BlockingConnectionPool: The pool.
+
+    """
+
+    commands_size, pubsub_size = POOL_SIZES[ROLE]
+
+    if pubsub:
+        max_connections = _get_env_number('ANTBS_REDIS_PUBSUB_MAX_CONNECTIONS', pubsub_size)
+        socket_timeout = None
+    else:
+        max_connections = _get_env_number('ANTBS_REDIS_MAX_CONNECTIONS', commands_size)
+        socket_timeout = _get_env_number('ANTBS_REDIS_SOCKET_TIMEOUT', None, float)
+
+    url = os.environ.get('ANTBS_REDIS_URL', DEFAULT_URL)
+    kwargs = dict(
+        max_connections=max_connections,
+        timeout=_get_env_number('ANTBS_REDIS_POOL_TIMEOUT', 20),
+        socket_timeout=socket_timeout,
+        parser_class=DefaultParser,
+        decode_responses=not binary
+    )
+
+    if not url.startswith('unix://'):
+        # Unix socket connections don't support a separate connect timeout.
+        kwargs['socket_connect_timeout'] = _get_env_number('ANTBS_REDIS_CONNECT_TIMEOUT', 5, float)
+
+    return redis.BlockingConnectionPool.from_url(url, **kwargs)
+
+
+def create_client(pubsub=False, binary=False):
+    """ Creates a redis client backed by a new connection pool (see `create_connection_pool`). """
+    return redis.StrictRedis(connection_pool=create_connection_pool(pubsub, binary))
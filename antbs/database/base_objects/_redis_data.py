@@ -28,11 +28,17 @@
 
 """ Descriptor objects for accessing data stored in redis. """
 
-import redis
 import logging
+import os
 import time
 
-db = redis.StrictRedis(unix_socket_path='/var/run/redis/redis.sock', decode_responses=True)
+from utils.utility_classes import LRUCache
+
+from ._redis_connection import create_client
+
+db = create_client()
+pubsub_db = create_client(pubsub=True)
+binary_db = create_client(binary=True)
 logger = logging.getLogger('antbs')
 
 
@@ -105,7 +111,13 @@ class RedisDataHashField(RedisData):
        Descriptor that facilitates attribute access to data stored in redis hashes.
 
        Attributes:
-           field_name (str): The name of the redis hash field for the bound attribute.
+           field_name (str):  The name of the redis hash field for the bound attribute.
+           can_expire (bool): Whether or not the field can be set to expire by assigning a
+                              `(value, seconds)` tuple. Such fields are not stored in the hash,
+                              they are stored in their own key (`parent_key:field_name`) so that
+                              redis takes care of the expiration (`SETEX`). Values that are
+                              still stored in the hash (with their expiration time in the
+                              `field_name__exp` field) are moved to that key when read.
 
     """
 
@@ -114,13 +126,23 @@ class RedisDataHashField(RedisData):
 
         self.field_name = field_name
         self.can_expire = can_expire
-        self.expire_key = field_name + '__exp' if can_expire else ''
+        self.legacy_expire_field = field_name + '__exp' if can_expire else ''
 
     def __get__(self, obj, obj_type):
         if self.can_expire:
-            self._check_expire(obj)
+            val = db.get(self._get_expiring_key(obj))
+
+            if val is None:
+                val = self._migrate_legacy_value(obj)
+        else:
+            found, val = obj.batch_lookup(self.field_name)
+
+            if not found:
+                found, val = obj.snapshot_lookup(self.field_name)
+
+            if not found:
+                val = db.hget(obj.full_key, self.field_name)
 
-        val = db.hget(obj.full_key, self.field_name)
         value = self._decode_value(val, self.default_value, self.value_type)
 
         self._type_check(value, self.value_type, self.__class__.__name__, self.field_name)
@@ -128,43 +150,73 @@ class RedisDataHashField(RedisData):
         return value
 
     def __set__(self, obj, value):
+        expire_time = None
+
         if self.can_expire and isinstance(value, tuple):
             value, expire_time = value
 
-            self._expire_in(obj, self.expire_key, expire_time)
-
         val = self._encode_value(value, self.default_value)
 
         self._type_check(val, str, self.__class__.__name__, self.field_name)
 
-        db.hset(obj.full_key, self.field_name, val)
+        if self.can_expire:
+            self._set_expiring(obj, val, expire_time)
+            return
 
-    def _check_expire(self, obj):
-        if self._will_expire(obj, self.expire_key) and self._is_expired(obj):
-            db.hdel(obj.full_key, self.expire_key)
-            self.__set__(obj, self.default_value)
+        if obj.is_batching:
+            obj.batch_set(self.field_name, val)
+            return
 
-    @staticmethod
-    def _expire_in(obj, exp_key, seconds):
-        """ Set field to expire in redis. """
-        expires = int(time.time()) + seconds
+        if obj.changes_channel:
+            pipe = db.pipeline(transaction=False)
+            pipe.hset(obj.full_key, self.field_name, val)
+            pipe.publish(obj.changes_channel, self.field_name)
+            pipe.execute()
+        else:
+            db.hset(obj.full_key, self.field_name, val)
 
-        db.hset(obj.full_key, exp_key, expires)
+        obj.snapshot_update(self.field_name, val)
 
-    @staticmethod
-    def _hget(key, field, default_value):
-        val = db.hget(key, field)
-        return val if val is not None else default_value
+    def _get_expiring_key(self, obj):
+        return '{0}:{1}'.format(obj.full_key, self.field_name)
 
-    def _is_expired(self, obj):
-        expire_time = self._hget(obj.full_key, self.expire_key, 0)
-        now = int(time.time())
+    def _migrate_legacy_value(self, obj):
+        """
+        Move the value of a field that can expire from the hash (where it was stored along with
+        its expiration time before fields got their own keys) to its own key. Returns the value
+        (`None` if there is none or it has expired).
 
-        return now > int(expire_time)
+        """
 
-    @staticmethod
-    def _will_expire(obj, exp_key):
-        return db.hexists(obj.full_key, exp_key)
+        val, expires = db.hmget(obj.full_key, self.field_name, self.legacy_expire_field)
+
+        if val is None and expires is None:
+            return None
+
+        seconds = int(expires) - int(time.time()) if expires else None
+
+        if seconds is not None and seconds <= 0:
+            val = None
+        elif val is not None and not db.set(self._get_expiring_key(obj), val, ex=seconds, nx=True):
+            # It was set in the meantime.
+            val = db.get(self._get_expiring_key(obj))
+
+        db.hdel(obj.full_key, self.field_name, self.legacy_expire_field)
+
+        return val
+
+    def _set_expiring(self, obj, val, seconds=None):
+        """ Store the value of a field that can expire (in `seconds` if not `None`). """
+        key = self._get_expiring_key(obj)
+        pipe = db.pipeline()
+
+        if seconds is None:
+            pipe.set(key, val)
+        else:
+            pipe.setex(key, seconds, val)
+
+        pipe.hdel(obj.full_key, self.field_name, self.legacy_expire_field)
+        pipe.execute()
 
 
 class RedisDataRedisObject(RedisData):
@@ -172,27 +224,40 @@ class RedisDataRedisObject(RedisData):
        Descriptor that facilitates attribute access to other redis objects from a redis object.
 
        Attributes:
-           key (str): The name for the bound attribute (redis key = parent_key:name)
+           key (str):     The name for the bound attribute (redis key = parent_key:name)
+           kwargs (dict): Extra keyword arguments for the child object's constructor.
+
+       Child objects are cached (by their full key) in an LRU cache that is shared by all
+       instances of this descriptor. Its size can be set with `ANTBS_CHILD_OBJECT_CACHE_SIZE`.
 
     """
 
-    _instances = None
+    _instances = LRUCache(maxsize=int(os.environ.get('ANTBS_CHILD_OBJECT_CACHE_SIZE', 4096)))
 
-    def __init__(self, key, default_value):
+    def __init__(self, key, default_value, **kwargs):
         super().__init__(default_value, default_value)
 
         self.key = key
-
-        if self._instances is None:
-            self._instances = {}
+        self.kwargs = kwargs
 
     def __get__(self, obj, obj_type):
         full_key = self._get_full_key_for_child_object(obj)
 
-        if full_key not in self._instances:
-            self._instances[full_key] = self.default_value.as_child(full_key, str)
+        if getattr(obj, 'is_batching', False):
+            # Mutations of the child object must be buffered in the parent's batch, so
+            # we give out an object bound to the batch pipeline instead of the cached one.
+            child = self.default_value.as_child(full_key, str, **self.kwargs)
+            child.pipeline = obj.batch_pipeline
+
+            return child
 
-        return self._instances[full_key]
+        child = self._instances.get(full_key)
+
+        if child is None:
+            child = self.default_value.as_child(full_key, str, **self.kwargs)
+            self._instances[full_key] = child
+
+        return child
 
     def __set__(self, obj, value):
         full_key = self._get_full_key_for_child_object(obj)
@@ -204,6 +269,11 @@ class RedisDataRedisObject(RedisData):
     def _get_full_key_for_child_object(self, obj):
         return '{0}:{1}'.format(obj.full_key, self.key)
 
+    @classmethod
+    def cache_stats(cls):
+        """ Returns the hit/miss/eviction counters and the size of the child object cache. """
+        return cls._instances.stats()
+
 
 def bool_string_helper(value):
     """
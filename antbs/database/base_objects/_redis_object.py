@@ -35,6 +35,8 @@ class RedisObject:
     """ A base object backed by redis. This class should not be used directly. """
 
     db = db
+    pipeline = None
+    bulk_chunk_size = 1000
     _subclass_names = ['RedisList', 'RedisZset']
     attrib_lists = dict(string=[], bool=[], int=[], list=[], set=[], path=[])
     all_attribs = []
@@ -73,15 +75,19 @@ class RedisObject:
                     'Cannot specify a step to a {0} object slice'.format(self.__class__.__name__)
                 )
 
+            # Open-ended slices: redis needs explicit (inclusive) bounds.
+            start = 0 if index.start is None else index.start
+            stop = -1 if index.stop is None else index.stop
+
             if self.__class__.__name__ == 'RedisList':
                 return [
                     RedisObject.decode_value(self.item_type, el)
-                    for el in self.db.lrange(self.full_key, index.start, index.stop)
+                    for el in self.db.lrange(self.full_key, start, stop)
                     ]
             elif self.__class__.__name__ == 'RedisZSet':
                 return [
                     RedisObject.decode_value(self.item_type, el)
-                    for el in self.db.zrange(self.full_key, index.start, index.stop)
+                    for el in self.db.zrange(self.full_key, start, stop)
                     ]
 
         else:
@@ -106,19 +112,21 @@ class RedisObject:
                 'ServerStatus object cant be converted to json (it contains private data!!)'
             )
 
-        elif 'RedisHash' == self.__class__.__name__:
+        elif hasattr(self, 'snapshot'):
+            # Any RedisHash (or subclass): serve all of the reads from a single HGETALL.
             as_dict = dict()
 
-            for key in self.all_attribs:
-                if key in ['log_str', 'log', 'pkgbuild']:
-                    continue
+            with self.snapshot():
+                for key in self.all_attribs:
+                    if key in ['log_str', 'log', 'pkgbuild']:
+                        continue
 
-                val = getattr(self, key)
+                    val = getattr(self, key)
 
-                if not isinstance(val, (str, dict, bool, int)) and hasattr(val, '__json__'):
-                    as_dict[key] = val.__json__()
-                else:
-                    as_dict[key] = val
+                    if not isinstance(val, (str, dict, bool, int)) and hasattr(val, '__json__'):
+                        as_dict[key] = val.__json__()
+                    else:
+                        as_dict[key] = val
 
             res = as_dict
 
@@ -135,7 +143,7 @@ class RedisObject:
         return self.full_key
 
     @classmethod
-    def as_child(cls, key, item_type):
+    def as_child(cls, key, item_type, **kwargs):
         """
         Alternative callable constructor that instead defines this as a child object.
         This allows you to store classes derived from `RedisObject` inside other classes
@@ -145,13 +153,27 @@ class RedisObject:
             key (str):             The redis key for this object.
             item_type (type(str)): The built-in type object for the type of data stored in
                                    this object.
+            kwargs:                Extra keyword arguments for the constructor.
         """
 
         def helper(_=None):
-            return cls(key, item_type)
+            return cls(key, item_type, **kwargs)
 
         return helper()
 
+    def _get_range(self, start, stop):
+        raise NotImplementedError('Subclasses must implement this method!')
+
+    def _chunks(self, values):
+        """ Split a list of values into lists of at most `bulk_chunk_size` values. """
+        for start in range(0, len(values), self.bulk_chunk_size):
+            yield values[start:start + self.bulk_chunk_size]
+
+    @property
+    def writer(self):
+        """ The redis client (or pipeline when this object is part of a batch) to write with. """
+        return self.db if self.pipeline is None else self.pipeline
+
     @staticmethod
     def decode_value(obj_type, value):
         """ Decode a value if it is non-None, otherwise, decode with no arguments. """
@@ -169,6 +191,38 @@ class RedisObject:
         """ Encode a value using json.dumps, with default = str. """
         return str(value)
 
+    def iter_chunks(self, size=500, start=0, stop=-1):
+        """
+        Iterate over the items from index `start` to `stop` (inclusive) in chunks (lists) of
+        at most `size` items. Only one chunk is held in memory at a time, so this should be
+        used instead of iterating over the whole object when it holds a lot of items.
+
+        """
+
+        length = len(self)
+        start = max(0, start + length if start < 0 else start)
+        stop = stop + length if stop < 0 else min(stop, length - 1)
+
+        while start <= stop:
+            chunk = self._get_range(start, min(start + size - 1, stop))
+
+            if not chunk:
+                break
+
+            yield [self.decode_value(self.item_type, el) for el in chunk]
+
+            start += size
+
+    def iter_range(self, start=0, stop=-1, step_size=500):
+        """
+        Iterate over the items from index `start` to `stop` (inclusive), fetching them from
+        redis `step_size` items at a time.
+
+        """
+
+        for chunk in self.iter_chunks(step_size, start, stop):
+            yield from chunk
+
     def json(self):
         """ Return this object as a json serialized string. """
         return json.dumps(self.__json__())
@@ -26,7 +26,9 @@
 #  You should have received a copy of the GNU General Public License
 #  along with AntBS; If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import errno
+import json
 import os
 import time
 
@@ -40,6 +42,81 @@ from . import (
     Singleton
 )
 
+# Lua script that creates a new object atomically (see `RedisHash.create_object()`).
+# KEYS[1] is the id counter, ARGV[1] is the object's full key, ARGV[2] a json spec and the
+# rest of ARGV the names of the fields whose values are templates (like the key).
+_CREATE_OBJECT_SCRIPT = """
+local spec = cjson.decode(ARGV[2])
+local full_key = ARGV[1]
+local id
+
+-- Plain text replacement (no Lua patterns), values are used as is otherwise.
+local function fill_in_id(template)
+    local result, start = '', 1
+    local first, last = string.find(template, '{id}', start, true)
+
+    while first do
+        result = result .. string.sub(template, start, first - 1) .. id
+        start = last + 1
+        first, last = string.find(template, '{id}', start, true)
+    end
+
+    return result .. string.sub(template, start)
+end
+
+local templated = {}
+for i = 3, #ARGV do
+    templated[ARGV[i]] = true
+end
+
+if string.find(full_key, '{id}', 1, true) then
+    id = redis.call('INCR', KEYS[1])
+    full_key = fill_in_id(full_key)
+else
+    local existing = redis.call('HGET', full_key, spec.id_field)
+    if existing and existing ~= '' and existing ~= '0' then
+        return {existing, 0}
+    end
+    id = redis.call('INCR', KEYS[1])
+end
+
+local hash = {spec.id_field, id}
+for field, value in pairs(spec.fields) do
+    hash[#hash + 1] = field
+    if templated[field] then
+        value = fill_in_id(value)
+    end
+    hash[#hash + 1] = value
+end
+redis.call('HMSET', full_key, unpack(hash))
+
+for name, items in pairs(spec.lists) do
+    if #items > 0 then
+        redis.call('RPUSH', full_key .. ':' .. name, unpack(items))
+    end
+end
+
+for name, items in pairs(spec.sets) do
+    for _, item in ipairs(items) do
+        redis.call('ZADD', full_key .. ':' .. name, 1, item)
+    end
+end
+
+for _, list_key in ipairs(spec.append_id_to) do
+    redis.call('RPUSH', list_key, id)
+    -- Keep the membership index of indexed lists (see `RedisList`) in sync.
+    if redis.call('EXISTS', list_key .. ':index') == 1 then
+        redis.call('HINCRBY', list_key .. ':index', id, 1)
+    end
+end
+
+for set_key, member in pairs(spec.add_to_sets) do
+    redis.call('ZADD', set_key, 1, member)
+end
+
+return {tostring(id), 1}
+"""
+
 
 class RedisHashMCS(type):
     def __new__(mcs, cls, bases, cls_dict):
@@ -64,7 +141,8 @@ class RedisHashMCS(type):
                 value = RedisDataHashField(attrib_name, 0, int, can_expire)
 
             elif attrib_name in instance.attrib_lists['list']:
-                value = RedisDataRedisObject(attrib_name, RedisList)
+                indexed = attrib_name in instance.indexed_lists
+                value = RedisDataRedisObject(attrib_name, RedisList, indexed=indexed)
 
             elif attrib_name in instance.attrib_lists['set']:
                 value = RedisDataRedisObject(attrib_name, RedisZSet)
@@ -102,14 +180,43 @@ class RedisHash(RedisObject, metaclass=RedisHashMCS):
             attrib_lists (dict): Contains lists of class attributes that are stored in redis
                                  organized by their value type.
             all_keys (list):  List of all class attributes that are stored in redis.
+            changes_channel (str): When set, the names of fields written to the hash are
+                                   published on this redis channel.
+            indexed_lists (list): Names of `list` attributes that maintain a membership index
+                                  (see `RedisList`) so that `item in obj.attrib` is O(1).
+
+        Snapshots:
+            By default every attribute read is a round trip to redis. Calling `load_snapshot()`
+            fetches the object's hash fields in a single request (`HGETALL`, or `HMGET` when a
+            projection of `fields` is given) and serves subsequent reads of those fields from
+            memory until the snapshot is refreshed or dropped. Writes update the snapshot so it
+            never returns a value older than one written through this object. Fields that can
+            expire and child objects (lists and sets) are always read from redis.
+
+        Batches:
+            Inside a `with obj.batch():` block, field writes and mutations of child lists and
+            sets are buffered and then sent to redis in a single `MULTI`/`EXEC` round trip when
+            the block exits. Reads of a field that was written inside the block return the
+            pending value. If the block raises, the buffered writes are discarded. Fields that
+            can expire and list pops are not buffered.
 
     """
 
     all_attribs = []
     attrib_lists = dict(string=[], bool=[], int=[], list=[], set=[], path=[])
     can_expire = []
-
-    def __init__(self, namespace='antbs', prefix='', key='', *args, **kwargs):
+    changes_channel = None
+    indexed_lists = []
+
+    _snapshot = None
+    _snapshot_fields = None
+    _batch_pending = None
+    _create_object = db.register_script(_CREATE_OBJECT_SCRIPT)
+    batch_pipeline = None
+    bulk_fetch_chunk_size = 500
+
+    def __init__(self, namespace='antbs', prefix='', key='', *args, snapshot=None,
+                 snapshot_fields=None, **kwargs):
         if 'status' != prefix and not key and not prefix:
             raise ValueError('Both "prefix" and "key" are required')
 
@@ -125,6 +232,20 @@ class RedisHash(RedisObject, metaclass=RedisHashMCS):
         self.all_attribs = getattr(type(self), 'all_attribs')
         self.attrib_lists = getattr(type(self), 'attrib_lists')
 
+        if snapshot is not None:
+            self.set_snapshot(snapshot, snapshot_fields)
+
+    def __bool__(self):
+        """ Tests if this object currently exists in redis. """
+        if self._snapshot is not None and self._snapshot_fields is None:
+            return bool(self._snapshot)
+
+        if self._snapshot and any(v is not None for v in self._snapshot.values()):
+            # A projection that found at least one field proves that the hash exists.
+            return True
+
+        return super().__bool__()
+
     def __getitem__(self, item):
         """ Get and return the value of a field (item) from this objects redis hash."""
         return getattr(self, item)
@@ -205,3 +326,277 @@ class RedisHash(RedisObject, metaclass=RedisHashMCS):
 
     def iterkeys(self):
         return self.__iter__()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager that buffers writes to this object and flushes them to redis
+        in a single transaction when the block exits. Nested blocks join the outer batch.
+
+        """
+
+        if self.is_batching:
+            yield self
+            return
+
+        self.batch_pipeline = self.db.pipeline(transaction=True)
+        self._batch_pending = {}
+
+        try:
+            yield self
+        except Exception:
+            self.batch_pipeline.reset()
+            raise
+        else:
+            pending = self._batch_pending
+
+            if pending:
+                self.batch_pipeline.hmset(self.full_key, pending)
+
+                if self.changes_channel:
+                    self.batch_pipeline.publish(self.changes_channel, ','.join(pending))
+
+            self.batch_pipeline.execute()
+
+            for field, value in pending.items():
+                self.snapshot_update(field, value)
+        finally:
+            self.batch_pipeline = self._batch_pending = None
+
+    def batch_lookup(self, field):
+        """
+        Get a field's pending (not yet written) value from the current batch.
+
+        Returns:
+            tuple: (is_pending (bool), value (str|None))
+
+        """
+
+        if self._batch_pending is None or field not in self._batch_pending:
+            return False, None
+
+        return True, self._batch_pending[field]
+
+    def batch_set(self, field, value):
+        """ Buffer a field's (encoded) value to be written when the current batch exits. """
+        if not self.is_batching:
+            raise RuntimeError('Cannot buffer a write outside of a batch.')
+
+        self._batch_pending[field] = value
+
+    @property
+    def is_batching(self):
+        """ Whether or not writes to this object are currently being buffered. """
+        return self._batch_pending is not None
+
+    @property
+    def has_snapshot(self):
+        """ Whether or not field reads are currently being served from a snapshot. """
+        return self._snapshot is not None
+
+    @classmethod
+    def _get_hash_fields(cls, fields=None):
+        """ Return names of the fields in `fields` (or all fields) that are stored in the hash. """
+        _fields = cls.all_attribs if fields is None else fields
+        _children = cls.attrib_lists['list'] + cls.attrib_lists['set']
+
+        for field in _fields:
+            if field not in cls.all_attribs:
+                raise ValueError('{0} has no field named {1}'.format(cls.__name__, field))
+
+        return [f for f in _fields if f not in _children and f not in cls.can_expire]
+
+    @classmethod
+    def create_object(cls, full_key, id_field, counter_key, fields=None, children=None,
+                      append_id_to=None, add_to_sets=None, templated_fields=None):
+        """
+        Create a new object of this class in a single round trip. A Lua script allocates the
+        object's id from `counter_key`, writes its fields and children and adds it to the
+        given lists and sets, all atomically. This avoids races between workers that create
+        objects concurrently.
+
+        Args:
+            full_key (str):      The object's redis key. `{id}` is replaced with the new id.
+                                 When the key does not contain `{id}` and the object already
+                                 has an id, nothing is written.
+            id_field (str):      The field that the new id is stored in.
+            counter_key (str):   The redis key of the counter that ids are allocated from.
+            fields (dict):       Initial values of the object's fields.
+            children (dict):     Initial items of the object's lists and sets.
+            append_id_to (list): Full keys of lists that the new id is appended to.
+            add_to_sets (dict):  Full keys of sets mapped to a member to add to each of them.
+            templated_fields (list): Fields whose values also get `{id}` replaced with the new
+                                     id (other values are stored as given).
+
+        Returns:
+            tuple: The object's id (str) and whether or not the object was created (bool).
+
+        Raises:
+            ValueError: If `fields` or `children` contains a name that is not a field or child
+                        of this class.
+
+        """
+
+        fields = {f: v for f, v in (fields or {}).items() if v is not None}
+        children = children or {}
+
+        if len(cls._get_hash_fields(list(fields))) != len(fields):
+            raise ValueError('Only fields stored in the hash can be set by create_object().')
+
+        for name in children:
+            if name not in cls.attrib_lists['list'] + cls.attrib_lists['set']:
+                raise ValueError('{0} has no child named {1}'.format(cls.__name__, name))
+
+        templated_fields = [f for f in templated_fields or [] if f in fields]
+
+        spec = dict(
+            id_field=id_field,
+            fields={f: RedisDataHashField._encode_value(v, '') for f, v in fields.items()},
+            lists={
+                name: [str(item) for item in items if item]
+                for name, items in children.items() if name in cls.attrib_lists['list']
+            },
+            sets={
+                name: [str(item) for item in items if item]
+                for name, items in children.items() if name in cls.attrib_lists['set']
+            },
+            append_id_to=append_id_to or [],
+            add_to_sets=add_to_sets or {},
+        )
+
+        args = [full_key, json.dumps(spec)] + templated_fields
+        obj_id, created = cls._create_object(keys=[counter_key], args=args)
+
+        return obj_id, bool(created)
+
+    def delete(self):
+        """ Delete this object (and the keys of its fields that can expire) from redis. """
+        expiring_keys = ['{0}:{1}'.format(self.full_key, field) for field in self.can_expire]
+        self.db.delete(self.full_key, *expiring_keys)
+
+    @classmethod
+    def fetch_snapshots(cls, full_keys, fields=None):
+        """
+        Fetch the hash fields of many objects of this class using pipelined requests.
+
+        Args:
+            full_keys (list): The redis keys of the objects.
+            fields (list):    Only fetch these fields (a projection). All fields when `None`.
+
+        Returns:
+            list: `(snapshot, fields)` tuples in the same order as `full_keys`. They can be
+                  passed to the class constructor as `snapshot` and `snapshot_fields`.
+
+        """
+
+        hash_fields = None if fields is None else cls._get_hash_fields(fields)
+        size = cls.bulk_fetch_chunk_size
+        snapshots = []
+
+        for start in range(0, len(full_keys), size):
+            pipe = cls.db.pipeline(transaction=False)
+
+            for full_key in full_keys[start:start + size]:
+                if hash_fields is None:
+                    pipe.hgetall(full_key)
+                elif hash_fields:
+                    pipe.hmget(full_key, hash_fields)
+
+            if hash_fields is None:
+                snapshots.extend((res, None) for res in pipe.execute())
+            elif hash_fields:
+                snapshots.extend((dict(zip(hash_fields, res)), hash_fields) for res in pipe.execute())
+            else:
+                snapshots.extend(({}, hash_fields) for _ in full_keys[start:start + size])
+
+        return snapshots
+
+    def load_snapshot(self, fields=None):
+        """
+        Load this object's hash fields from redis in a single request. Subsequent reads of
+        those fields are served from memory until `refresh_snapshot()` or `drop_snapshot()`.
+
+        Args:
+            fields (list): Only load these fields (a projection). All fields when `None`.
+
+        """
+
+        if fields is None:
+            snapshot = self.db.hgetall(self.full_key)
+            hash_fields = None
+        else:
+            hash_fields = self._get_hash_fields(fields)
+            values = self.db.hmget(self.full_key, hash_fields) if hash_fields else []
+            snapshot = dict(zip(hash_fields, values))
+
+        self.set_snapshot(snapshot, hash_fields)
+
+    def set_snapshot(self, snapshot, fields=None):
+        """
+        Use hash values that were already fetched from redis as this object's snapshot.
+
+        Args:
+            snapshot (dict): The raw hash values (as returned by `HGETALL`).
+            fields (list):   The fields that `snapshot` covers. All fields when `None`.
+
+        """
+
+        self._snapshot = {} if snapshot is None else snapshot
+        self._snapshot_fields = None if fields is None else frozenset(fields)
+
+    def refresh_snapshot(self):
+        """ Reload the current snapshot (using the same projection) from redis. """
+        if self._snapshot is None:
+            return
+
+        fields = None if self._snapshot_fields is None else list(self._snapshot_fields)
+
+        self.load_snapshot(fields)
+
+    def drop_snapshot(self):
+        """ Stop serving reads from the snapshot (all reads will go to redis again). """
+        self._snapshot = self._snapshot_fields = None
+
+    @contextlib.contextmanager
+    def snapshot(self, fields=None):
+        """
+        Context manager that serves reads from a snapshot for the duration of the block.
+        If the object already has a snapshot it is used as is and kept after the block.
+
+        """
+
+        if self._snapshot is not None:
+            yield self
+            return
+
+        self.load_snapshot(fields)
+
+        try:
+            yield self
+        finally:
+            self.drop_snapshot()
+
+    def snapshot_lookup(self, field):
+        """
+        Get a field's raw value from the snapshot.
+
+        Returns:
+            tuple: (in_snapshot (bool), value (str|None))
+
+        """
+
+        snapshot = self._snapshot
+        fields = self._snapshot_fields
+
+        if snapshot is None or (fields is not None and field not in fields):
+            return False, None
+
+        return True, snapshot.get(field)
+
+    def snapshot_update(self, field, value):
+        """ Keep the snapshot (if any) in sync with a value that was written to redis. """
+        if self._snapshot is None:
+            return
+
+        if self._snapshot_fields is None or field in self._snapshot_fields:
+            self._snapshot[field] = value
@@ -26,9 +26,82 @@
 #  You should have received a copy of the GNU General Public License
 #  along with AntBS; If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
+
 from . import RedisObject
 
 
+# Lua scripts that keep the membership index of an indexed list in sync with the list.
+# KEYS[1] is the list and KEYS[2] is its index (a hash of item -> number of occurrences).
+# The index is only maintained while it exists. When it is missing it gets (re)built from
+# the list by the next membership test, so it can never hold stale data.
+_INDEX_DECR = """
+local function decr(item, count)
+    if redis.call('HINCRBY', KEYS[2], item, -count) <= 0 then
+        redis.call('HDEL', KEYS[2], item)
+    end
+end
+"""
+
+_CONTAINS_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    for _, item in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+        redis.call('HINCRBY', KEYS[2], item, 1)
+    end
+end
+return redis.call('HEXISTS', KEYS[2], ARGV[1])
+"""
+
+_PUSH_SCRIPT = """
+local count = redis.call(ARGV[1], KEYS[1], unpack(ARGV, 2))
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    for i = 2, #ARGV do
+        redis.call('HINCRBY', KEYS[2], ARGV[i], 1)
+    end
+end
+return count
+"""
+
+_POP_SCRIPT = _INDEX_DECR + """
+local item = redis.call(ARGV[1], KEYS[1])
+if item and redis.call('EXISTS', KEYS[2]) == 1 then
+    decr(item, 1)
+end
+return item
+"""
+
+_REMOVE_SCRIPT = _INDEX_DECR + """
+local removed = redis.call('LREM', KEYS[1], ARGV[1], ARGV[2])
+if removed > 0 and redis.call('EXISTS', KEYS[2]) == 1 then
+    decr(ARGV[2], removed)
+end
+return removed
+"""
+
+_SET_SCRIPT = _INDEX_DECR + """
+local old = redis.call('LINDEX', KEYS[1], ARGV[1])
+redis.call('LSET', KEYS[1], ARGV[1], ARGV[2])
+if old and redis.call('EXISTS', KEYS[2]) == 1 then
+    decr(old, 1)
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+return old
+"""
+
+_DELETE_AT_SCRIPT = _INDEX_DECR + """
+local old = redis.call('LINDEX', KEYS[1], ARGV[1])
+if not old then
+    return redis.error_reply('ERR index out of range')
+end
+redis.call('LSET', KEYS[1], ARGV[1], '__DELETED__')
+redis.call('LREM', KEYS[1], 1, '__DELETED__')
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    decr(old, 1)
+end
+return old
+"""
+
+
 class RedisList(RedisObject, list):
     """
     A list where all items are stored in Redis.
@@ -37,30 +110,55 @@ class RedisList(RedisObject, list):
         full_key (str):     Use this as the redis key.
         item_type (object): The constructor to use when reading items from redis.
         items (list):       Default values to store during construction.
+        indexed (bool):     Maintain a membership index for this list so that `in` is a
+                            single O(1) command instead of a transfer of the whole list.
+                            The index is stored at `full_key:index` and is kept in sync
+                            atomically by every method that mutates the list.
 
     """
 
-    def __init__(self, full_key=None, item_type=str, items=None):
+    _contains = RedisObject.db.register_script(_CONTAINS_SCRIPT)
+    _push = RedisObject.db.register_script(_PUSH_SCRIPT)
+    _pop = RedisObject.db.register_script(_POP_SCRIPT)
+    _remove = RedisObject.db.register_script(_REMOVE_SCRIPT)
+    _set = RedisObject.db.register_script(_SET_SCRIPT)
+    _delete_at = RedisObject.db.register_script(_DELETE_AT_SCRIPT)
+
+    def __init__(self, full_key=None, item_type=str, items=None, indexed=False):
 
         super().__init__(full_key=full_key)
         self.item_type = item_type
+        self.indexed = indexed
+        self.index_key = '{0}:index'.format(full_key)
 
         if items:
             for item in items:
                 self.append(item)
 
     def __add__(self, other_list):
-        """ Combine elements from this list (self) and other_list into a new list. """
-        return [x for x in self.__iter__()] + [x for x in other_list.__iter__()]
+        """ Lazily combine elements from this list (self) and other_list into an iterator. """
+        if isinstance(other_list, RedisObject):
+            other_list = other_list.iter_range()
+
+        return itertools.chain(self.iter_range(), other_list)
 
     def __contains__(self, item):
         """ Check if item is in this list. """
-        return item in self.db.lrange(self.full_key, 0, -1)
+        if self.indexed:
+            keys = [self.full_key, self.index_key]
+            return bool(self._contains(keys=keys, args=[super().encode_value(item)]))
+
+        return super().encode_value(item) in self.db.lrange(self.full_key, 0, -1)
 
     def __delitem__(self, index):
         """ Delete an item from this list by index. """
-        self.db.lset(self.full_key, index, '__DELETED__')
-        self.db.lrem(self.full_key, 1, '__DELETED__')
+        if self.indexed:
+            keys = [self.full_key, self.index_key]
+            self._delete_at(keys=keys, args=[index], client=self.writer)
+            return
+
+        self.writer.lset(self.full_key, index, '__DELETED__')
+        self.writer.lrem(self.full_key, 1, '__DELETED__')
 
     def __iter__(self):
         """ Iterate over all items in this list. """
@@ -73,37 +171,119 @@ class RedisList(RedisObject, list):
 
     def __setitem__(self, index, val):
         """ Update an item by index. """
-        self.db.lset(self.full_key, index, super().encode_value(val))
+        if self.indexed:
+            args = [index, super().encode_value(val)]
+            self._set(keys=[self.full_key, self.index_key], args=args, client=self.writer)
+            return
+
+        self.writer.lset(self.full_key, index, super().encode_value(val))
 
     def __str__(self):
         """ Return this object as a string """
         return str([x for x in self.__iter__()])
 
+    def _get_range(self, start, stop):
+        return self.db.lrange(self.full_key, start, stop)
+
+    def _pop_item(self, command):
+        if self.indexed:
+            keys = [self.full_key, self.index_key]
+            return self._pop(keys=keys, args=[command.upper()], client=self.db)
+
+        return getattr(self.db, command)(self.full_key)
+
+    def _push_item(self, command, *vals, client=None):
+        client = client or self.writer
+        vals = [self.encode_value(val) for val in vals]
+
+        if self.indexed:
+            args = [command.upper()] + vals
+            self._push(keys=[self.full_key, self.index_key], args=args, client=client)
+            return
+
+        getattr(client, command)(self.full_key, *vals)
+
     def append(self, val):
         """ Append value to the end of this list """
         if val:
             self.rpush(val)
 
+    def delete(self):
+        """ Delete this list (and its index) from redis. """
+        self.writer.delete(self.full_key, self.index_key)
+
     def extend(self, iterable):
-        """ Append values in iterable to the end of this list """
-        if iterable:
-            for item in iterable:
-                self.append(item)
+        """ Append values in iterable to the end of this list using variadic `RPUSH`es. """
+        if not iterable:
+            return
+
+        items = [item for item in iterable if item]
+        chunks = list(self._chunks(items))
+
+        if len(chunks) < 2 or self.pipeline is not None:
+            for chunk in chunks:
+                self._push_item('rpush', *chunk)
+            return
+
+        pipe = self.db.pipeline()
+
+        for chunk in chunks:
+            self._push_item('rpush', *chunk, client=pipe)
+
+        pipe.execute()
 
     def lpop(self):
         """ Remove and return a value from the left (low) end of the list. """
-        return super().decode_value(self.item_type, self.db.lpop(self.full_key))
+        return super().decode_value(self.item_type, self._pop_item('lpop'))
 
     def lpush(self, val):
         """ Add an item to the left (low) end of the list. """
         if val:
-            self.db.lpush(self.full_key, super().encode_value(val))
+            self._push_item('lpush', val)
 
     def remove(self, val):
-        self.db.lrem(self.full_key, 0, val)
+        """ Remove all occurrences of a value. Returns the number of items that were removed. """
+        if self.indexed:
+            args = [0, super().encode_value(val)]
+            return self._remove(keys=[self.full_key, self.index_key], args=args, client=self.writer)
+
+        return self.writer.lrem(self.full_key, 0, val)
 
     def remove_range(self, start, stop):
-        self.db.ltrim(self.full_key, start, stop)
+        self.writer.ltrim(self.full_key, start, stop)
+
+        if self.indexed:
+            # The index is rebuilt from the trimmed list the next time it's needed.
+            self.writer.delete(self.index_key)
+
+    def replace_all(self, iterable):
+        """
+        Atomically replace all items in this list with the items in iterable. The new list is
+        built under a temporary key which is then renamed to this list's key, so readers never
+        see an empty or partially built list.
+
+        """
+
+        tmp_key = '{0}:tmp'.format(self.full_key)
+        items = [item for item in iterable if item]
+        pipe = self.writer if self.pipeline is not None else self.db.pipeline()
+
+        pipe.delete(tmp_key)
+
+        for chunk in self._chunks(items):
+            pipe.rpush(tmp_key, *[self.encode_value(val) for val in chunk])
+
+        if items:
+            pipe.rename(tmp_key, self.full_key)
+        else:
+            pipe.delete(self.full_key)
+
+        if self.indexed:
+            # The index is rebuilt from the new list the next time it's needed.
+            pipe.delete(self.index_key)
+
+        if pipe is not self.pipeline:
+            pipe.execute()
 
     def reverse(self):
         cp = list(self.db.lrange(self.full_key, 0, -1))
@@ -111,9 +291,9 @@ class RedisList(RedisObject, list):
 
     def rpop(self):
         """ Remove a value from the right (high) end of the list. """
-        return super().decode_value(self.item_type, self.db.rpop(self.full_key))
+        return super().decode_value(self.item_type, self._pop_item('rpop'))
 
     def rpush(self, val):
         """ Add an item to the right (high) end of the list. """
         if val:
-            self.db.rpush(self.full_key, super().encode_value(val))
+            self._push_item('rpush', val)
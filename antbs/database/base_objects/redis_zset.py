@@ -51,7 +51,7 @@ class RedisZSet(RedisObject, set):
 
     def __contains__(self, item):
         """ Check if item is in the set. """
-        return item in self.db.zrange(self.full_key, 0, -1)
+        return self.ismember(item)
 
     def __iter__(self):
         """ Iterate over all items in this set. """
@@ -66,17 +66,30 @@ class RedisZSet(RedisObject, set):
         """ Return this object as a string """
         return str([x for x in self.__iter__()])
 
+    def _get_range(self, start, stop):
+        return self.db.zrange(self.full_key, start, stop)
+
+    def _zadd_chunks(self, client, key, values):
+        for chunk in self._chunks(values):
+            vals = []
+
+            for val in chunk:
+                vals.extend([1, super().encode_value(val)])
+
+            client.zadd(key, *vals)
+
     def add(self, *values):
-        """ Add member(s) to sorted set. """
+        """ Add member(s) to sorted set using variadic `ZADD`s. """
         if not values:
             return
 
-        vals = []
-
-        for val in values:
-            vals.extend([1, val])
+        if len(values) <= self.bulk_chunk_size or self.pipeline is not None:
+            self._zadd_chunks(self.writer, self.full_key, values)
+            return
 
-        self.db.zadd(self.full_key, *vals)
+        pipe = self.db.pipeline()
+        self._zadd_chunks(pipe, self.full_key, values)
+        pipe.execute()
 
     def append(self, val):
         if val:
@@ -88,15 +101,38 @@ class RedisZSet(RedisObject, set):
 
     def ismember(self, val):
         """ Check if value is a member of set. """
-        return self.db.zrank(self.full_key, super().encode_value(val))
+        return self.db.zscore(self.full_key, super().encode_value(val)) is not None
 
     def remove(self, val):
         """ Remove a member from the set. """
-        self.db.zrem(self.full_key, super().encode_value(val))
+        self.writer.zrem(self.full_key, super().encode_value(val))
 
     def remove_range(self, start, stop):
         """ Remove all members at indexes from start to stop """
-        return self.db.zremrangebyrank(self.full_key, start, stop)
+        return self.writer.zremrangebyrank(self.full_key, start, stop)
+
+    def replace_all(self, iterable):
+        """
+        Atomically replace all members of this set with the items in iterable. The new set is
+        built under a temporary key which is then renamed to this set's key, so readers never
+        see an empty or partially built set.
+
+        """
+
+        tmp_key = '{0}:tmp'.format(self.full_key)
+        values = [val for val in iterable if val]
+        pipe = self.writer if self.pipeline is not None else self.db.pipeline()
+
+        pipe.delete(tmp_key)
+        self._zadd_chunks(pipe, tmp_key, values)
+
+        if values:
+            pipe.rename(tmp_key, self.full_key)
+        else:
+            pipe.delete(self.full_key)
+
+        if pipe is not self.pipeline:
+            pipe.execute()
 
     def sort(self, alpha=True):
         """ Get list of members sorted alphabetically. """
@@ -26,10 +26,13 @@
 # You should have received a copy of the GNU General Public License
 # along with AntBS; If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
+import itertools
 import os
 import io
+import threading
+import time
 from datetime import datetime
-from multiprocessing import Process
 
 import gevent
 from rq import Connection, get_current_job
@@ -43,12 +46,23 @@ from . import (
     status,
     get_timeline_object
 )
+from .build_log import CompressedLog, LogArchive
+from .identity_map import get_or_create, register
 
 from utils import (
     DockerUtils,
-    CustomSet,
+    LRUCache,
+    ResourceAllocator,
     remove,
-    sign_packages
+    sign_packages,
+    get_live_output_key,
+    add_live_output,
+    LiveOutputPublisher,
+    decode_lines,
+    strip_ansi,
+    dedupe,
+    add_timestamps,
+    fan_out
 )
 
 logger = status.logger
@@ -58,6 +72,12 @@ PKG_EXT = '.pkg.tar.xz'
 SIG_EXT = '.sig'
 gpg_key = status.gpg_key
 gpg_password = status.gpg_password
+resource_allocator = ResourceAllocator(status.db)
+
+# Builds are added to this zset (scored by the time their log was archived). Once they are
+# older than the retention window only the archived copy of their log is kept.
+LOG_RETENTION_KEY = 'antbs:misc:build_log_retention'
+LOG_RETENTION_DAYS = float(os.environ.get('ANTBS_LOG_RETENTION_DAYS', 14))
 
 
 class Build(RedisHash):
@@ -81,7 +101,9 @@ class Build(RedisHash):
             review_status: The build's developer review status.
             review_dev: The developer who reviewed the build result.
             review_date: The review's timestamp.
-            log_str: The build log, fully processed into HTML for display on the front-end.
+            log_str: The build log, fully processed into HTML for display on the front-end
+                     (only used by older builds, see `get_highlighted_log`).
+            cpuset: The cores that were allocated to the build's container.
 
 
         (bool)
@@ -92,9 +114,13 @@ class Build(RedisHash):
             bnum: ID assigned to the build.
             pkg_id: ID of the package that this build is for.
             tnum: ID of the transaction that this build is a part of.
+            cpus, mem_limit_mb: The resources that were allocated to the build's container.
+            build_seconds: How long the build's container ran.
+            cpu_seconds, max_mem_mb: The container's cpu time and peak memory usage.
 
         (list)
-            log: The build log, unprocessed, stored as lines in a list.
+            log: The build log, unprocessed, stored as lines in a list (only used by older
+                 builds, see `compressed_log`).
 
     Raises:
         ValueError: If both `pkg_obj` and `bnum` are Falsey.
@@ -105,99 +131,200 @@ class Build(RedisHash):
         string=['pkgname', 'pkgver', 'epoch', 'pkgrel', 'path', 'build_path',
                 'start_str', 'end_str', 'version_str', 'container', 'review_status',
                 'review_dev', 'review_date', 'log_str', 'pkg_id', 'bnum', 'tnum',
-                'repo_container', 'live_output_key', 'last_line_key', 'gh_diff'],
+                'repo_container', 'live_output_key', 'gh_diff', 'cpuset'],
         bool=['failed', 'completed', 'is_iso'],
-        int=[],
+        int=['cpus', 'mem_limit_mb', 'build_seconds', 'cpu_seconds', 'max_mem_mb'],
         list=['log'],
         set=['generated_pkgs', 'generated_files', 'staging_files'],
         path=['build_dir', 'result_dir', '_32build', '_32bit', 'cache', 'cache_i686']
     )
-
-    def __init__(self, pkg_obj=None, bnum=None, tnum=None, trans_obj=None, prefix='build'):
+    log_page_size = 500
+    # Package builds are sized to get through the cpu time of the package's last build in
+    # about `target_build_seconds`, with 1.5x its peak memory usage.
+    default_cpus = 2
+    default_mem_mb = 4096
+    min_mem_mb = 1024
+    max_cpus = int(os.environ.get('ANTBS_BUILD_MAX_CPUS', 8))
+    target_build_seconds = 600
+    log_archive = LogArchive()
+    _log_html_cache = LRUCache(maxsize=int(os.environ.get('ANTBS_LOG_HTML_CACHE_SIZE', 256)))
+
+    def __init__(self, pkg_obj=None, bnum=None, tnum=None, trans_obj=None, prefix='build',
+                 snapshot=None, snapshot_fields=None):
         if not pkg_obj and not bnum:
             raise ValueError
 
+        self._pkg_obj = None
+        self._trans_obj = None
+
         the_bnum = bnum
         if not bnum:
-            the_bnum = self.db.incr('antbs:misc:bnum:next')
+            self._pkg_obj = pkg_obj
+            self._trans_obj = trans_obj
+            the_bnum = self._create_build(pkg_obj, tnum, prefix)
 
-        super().__init__(prefix=prefix, key=the_bnum)
+        super().__init__(prefix=prefix, key=the_bnum, snapshot=snapshot,
+                         snapshot_fields=snapshot_fields)
 
         self.__namespaceinit__()
 
-        self._pkg_obj = None
-        self._trans_obj = None
+    @classmethod
+    def _create_build(cls, pkg_obj, tnum, prefix):
+        attribs = [a for a in cls._get_hash_fields() if a in pkg_obj._get_hash_fields()]
 
-        if pkg_obj and (not self or not self.bnum):
-            self._pkg_obj = pkg_obj
-            self._trans_obj = trans_obj
-            attribs = [a for a in pkg_obj.all_attribs if a in self.all_attribs]
+        with pkg_obj.snapshot(fields=attribs):
+            fields = {attrib: getattr(pkg_obj, attrib) for attrib in attribs}
 
-            for attrib in attribs:
-                value = getattr(pkg_obj, attrib)
-                setattr(self, attrib, value)
+        fields.update(
+            tnum=tnum,
+            failed=False,
+            completed=False,
+            # The build number is not known until the script allocates it.
+            live_output_key=get_live_output_key('{id}'),
+        )
 
-            self.bnum = the_bnum
-            self.tnum = tnum
-            self.failed = False
-            self.completed = False
-            self.live_output_key = 'live:build_output:{0}'.format(the_bnum)
-            self.last_line_key = 'tmp:build_log_last_line:{0}'.format(the_bnum)
+        bnum, _ = cls.create_object(
+            full_key='antbs:{0}:{{id}}'.format(prefix),
+            id_field='bnum',
+            counter_key='antbs:misc:bnum:next',
+            fields=fields,
+            templated_fields=['live_output_key'],
+        )
 
-    def publish_build_output(self):
-        if not self.container:
-            logger.error('Unable to publish build output. (Container is None)')
-            return
+        return bnum
+
+    @property
+    def container_name(self):
+        # Unique per build so that builds of a transaction can run concurrently.
+        return '{0}-{1}'.format(self.pkgname, self.bnum)
+
+    @property
+    def compressed_log(self):
+        return CompressedLog('{0}:compressed_log'.format(self.full_key))
 
-        output = doc.logs(container=self.container, stream=True, follow=True)
-        nodup = CustomSet()
-        content = []
+    def get_log_lines(self, start=0, stop=None):
+        """
+        Returns the build log's lines from `start` up to (but not including) `stop`. They are
+        read from redis when the log is still there, from the log archive otherwise. Logs of
+        older builds (stored in `log`) are supported too.
+
+        """
 
-        for line in output:
-            line = line.decode('UTF-8').rstrip()
-            if not line or 'makepkg]# PS1="' in line:
-                continue
-            end = line[25:]
-            if nodup.add(end):
-                line = line.replace("'", '')
-                line = line.replace('"', '')
-                line = '[{0}]: {1}'.format(datetime.now().strftime("%m/%d/%Y %I:%M%p"), line)
+        compressed_log = self.compressed_log
 
-                content.append(line)
-                self.db.publish(self.live_output_key, line)
-                self.db.setex(self.last_line_key, 1800, line)
+        if compressed_log:
+            return compressed_log.get_lines(start, stop)
 
-        result_ready = self.completed != self.failed
+        if self.log_archive.exists(self.bnum):
+            return self.log_archive.get_lines(self.bnum, start, stop)
 
-        if not result_ready:
-            waiting = 0
+        if stop is not None and stop <= start:
+            return []
 
-            while not result_ready:
-                waiting += 5
-                result_ready = self.completed != self.failed
+        return self.log[start:-1 if stop is None else stop - 1]
 
-                gevent.sleep(5)
+    def get_log_length(self):
+        compressed_log = self.compressed_log
 
-                if waiting > 300:
-                    logger.error('timed out will waiting for this build\'s final status')
-                    self.failed = True
-                    break
+        if compressed_log:
+            return len(compressed_log)
 
-        if self.failed:
-            self.db.publish(self.live_output_key, 'ENDOFLOG')
+        if self.log_archive.exists(self.bnum):
+            return self.log_archive.get_length(self.bnum)
+
+        return len(self.log)
+
+    def get_highlighted_log(self, start=0, stop=None):
+        """
+        Returns the build log's lines from `start` up to (but not including) `stop` as HTML
+        (highlighted with Pygments). The HTML for finished builds is cached in this process.
+
+        """
+
+        finished = self.completed or self.failed
+        cache_key = (self.bnum, start, stop)
+        html = self._log_html_cache.get(cache_key) if finished else None
+
+        if html is None:
+            html = highlight('\n'.join(self.get_log_lines(start, stop)), BashLexer(),
+                             HtmlFormatter(style='monokai', linenos='inline', linenostart=start + 1,
+                                           prestyles="background:#272822;color:#fff;"))
 
-        if len(content) > 9001:
-            content = content[:3000] + content[-3000:]
-        elif len(content) > 6001:
-            content = content[:1500] + content[-1500:]
+            if finished:
+                self._log_html_cache[cache_key] = html
 
-        for line in content:
-            self.log.rpush(line)
+        return html
 
-        log_content = '\n '.join(self.log)
-        self.log_str = highlight(log_content, BashLexer(),
-                                 HtmlFormatter(style='monokai', linenos='inline',
-                                               prestyles="background:#272822;color:#fff;"))
+    @classmethod
+    def log_html_cache_stats(cls):
+        """ Returns the hit/miss/eviction counters and the size of the log HTML cache. """
+        return cls._log_html_cache.stats()
+
+    @staticmethod
+    def _clean_build_output(lines):
+        for line in lines:
+            if line and 'makepkg]# PS1="' not in line:
+                yield line.replace("'", '').replace('"', '')
+
+    def publish_build_output(self, container=None, save_log=True, cancelled=None):
+        """
+        Streams a container's log to the live output stream and (when `save_log` is `True`)
+        to the compressed log in redis and the log archive, through a pipeline of generators
+        (see `utils.log_pipeline`) that only holds a bounded number of lines in memory. Returns
+        when the container exits (or `cancelled` is set). See `BuildOutputStreamer`.
+
+        Args:
+            container (str): The container's ID (default: the build's container).
+            save_log (bool): Save the output as the build's log.
+            cancelled (threading.Event): Stop streaming once this is set.
+
+        Returns:
+            bool: The log was saved to the log archive.
+
+        """
+
+        container = container or self.container
+
+        if not container:
+            logger.error('Unable to publish build output. (Container is None)')
+            return False
+
+        output = doc.logs(container=container, stream=True, follow=True)
+
+        if cancelled is not None:
+            output = itertools.takewhile(lambda _: not cancelled.is_set(), output)
+
+        lines = self._clean_build_output(strip_ansi(decode_lines(output)))
+        lines = add_timestamps(dedupe(lines, key=lambda line: line[25:]))
+        archived = False
+
+        with contextlib.ExitStack() as stack:
+            publisher = stack.enter_context(LiveOutputPublisher(self.db, self.bnum))
+            sinks = [publisher.add]
+
+            if save_log:
+                sinks.append(stack.enter_context(self.compressed_log.writer()).add)
+
+                try:
+                    sinks.append(stack.enter_context(self.log_archive.writer(self.bnum)).add)
+                    archived = True
+                except OSError as err:
+                    logger.error('Unable to archive log for build %s: %s', self.bnum, err)
+
+            fan_out(lines, *sinks)
+
+        logger.info('Published live output for build %s: %s', self.bnum, publisher.stats())
+
+        return archived
+
+    def finish_build_output(self, archived):
+        """ Ends the live output of a finished build and starts its log's retention period. """
+        if self.failed:
+            add_live_output(self.db, self.bnum, 'ENDOFLOG')
+
+        if archived:
+            self.db.zadd(LOG_RETENTION_KEY, time.time(), self.bnum)
+            expire_build_logs()
 
     def start(self, pkg_obj=None):
         if not self._pkg_obj and not pkg_obj:
@@ -250,6 +377,9 @@ class Build(RedisHash):
 
         with Connection(self.db):
             current_job = get_current_job()
+
+        # There is no current job in a transaction's build threads (see `Transaction.build_layer`).
+        if current_job is not None:
             current_job.meta['building_num'] = self.bnum
             current_job.save()
 
@@ -322,15 +452,78 @@ class Build(RedisHash):
 
         self.gh_diff = str(_file)
 
+    def _set_status(self, msg):
+        if self._trans_obj is not None:
+            self._trans_obj.update_status(msg)
+        else:
+            status.current_status = msg
+
+    def _get_resource_needs(self):
+        # Redis list slices map to LRANGE, which includes the stop index: this is the last six.
+        try:
+            previous = [bnum for bnum in self._pkg_obj.builds[-6:-1] if bnum and bnum != self.bnum]
+            bld_objs = get_build_objects(previous, fields=['cpu_seconds', 'max_mem_mb'])
+        except Exception as err:
+            logger.error('Unable to load previous builds of %s. Error Msg: %s', self.pkgname, err)
+            return self.default_cpus, self.default_mem_mb
+
+        for bld_obj in reversed(bld_objs):
+            if bld_obj.cpu_seconds and bld_obj.max_mem_mb:
+                cpus = -(-bld_obj.cpu_seconds // self.target_build_seconds)
+                mem_mb = max(self.min_mem_mb, bld_obj.max_mem_mb * 3 // 2)
+
+                return max(1, min(cpus, self.max_cpus)), mem_mb
+
+        return self.default_cpus, self.default_mem_mb
+
+    @contextlib.contextmanager
+    def _allocated_resources(self, cpus, mem_mb):
+        def on_wait():
+            self._set_status('Waiting for resources to build {0}.'.format(self._pkg_obj.pkgname))
+            logger.info('Build %s is waiting for resources.', self.bnum)
+
+        allocation = resource_allocator.allocate(self.bnum, cpus, mem_mb, on_wait=on_wait)
+
+        self.cpuset = allocation.cpuset
+        self.cpus = len(allocation.cpus)
+        self.mem_limit_mb = allocation.mem_mb
+
+        try:
+            yield allocation
+        finally:
+            resource_allocator.release(self.bnum)
+
+    def _start_usage_monitor(self, container_id):
+        usage = {}
+        monitor = threading.Thread(
+            target=lambda: usage.update(doc_util.get_container_usage(container_id)),
+            daemon=True
+        )
+        monitor.start()
+
+        return monitor, usage
+
+    def _save_resource_usage(self, started, monitor, usage):
+        self.build_seconds = int(time.time() - started)
+        monitor.join(timeout=10)
+
+        if usage:
+            self.cpu_seconds = usage['cpu_seconds']
+            self.max_mem_mb = usage['max_mem_mb']
+
     def _build_package(self):
+        with self._allocated_resources(*self._get_resource_needs()) as allocation:
+            return self._run_package_build(allocation)
+
+    def _run_package_build(self, allocation):
         self.building = self._pkg_obj.pkgname
         own_status = (
             'Building {0}-{1} with makepkg.'.format(self.building, self._pkg_obj.version_str)
         )
-        status.current_status = own_status
+        self._set_status(own_status)
         status.idle = False
 
-        doc_util.do_docker_clean(self._pkg_obj.pkgname)
+        doc_util.do_docker_clean(self.container_name)
 
         build_env = ['_AUTOSUMS=True'] if self._pkg_obj.auto_sum else ['_AUTOSUMS=False']
 
@@ -338,9 +531,12 @@ class Build(RedisHash):
         #    build_env.append('_ALEXPKG=True')
         # else:
         build_env.append('_ALEXPKG=False')
+        build_env.append('MAKEFLAGS=-j{0}'.format(len(allocation.cpus)))
 
         hconfig = doc_util.get_host_config('packages', self.build_dir, self.result_dir, None,
-                                           None, self._32build, self._32bit)
+                                           None, self._32build, self._32bit,
+                                           cpuset_cpus=allocation.cpuset,
+                                           mem_limit='{0}M'.format(allocation.mem_mb))
         container = {}
         try:
             container = doc.create_container(
@@ -351,7 +547,7 @@ class Build(RedisHash):
                          '/32build', '/result',
                          '/var/cache/pacman_i686'],
                 environment=build_env,
-                name=self._pkg_obj.pkgname,
+                name=self.container_name,
                 host_config=hconfig
             )
             if container.get('Warnings', False):
@@ -364,13 +560,16 @@ class Build(RedisHash):
 
         container_id = container.get('Id', '')
         self.container = container_id
-        stream_process = Process(target=self.publish_build_output)
+        streamer = BuildOutputStreamer(self)
 
         try:
             doc.start(container_id)
-            stream_process.start()
+            started = time.time()
+            streamer.start()
+            monitor, usage = self._start_usage_monitor(container_id)
 
             result = doc.wait(container_id)
+            self._save_resource_usage(started, monitor, usage)
 
             if int(result) != 0:
                 self.failed = True
@@ -384,10 +583,12 @@ class Build(RedisHash):
 
         except Exception as err:
             logger.error('Start container failed. Error Msg: %s', err)
+            streamer.cancel()
             self.save_build_results(False)
+            streamer.finish(timeout=30)
             return False
 
-        stream_process.join()
+        streamer.finish()
 
         if not self.failed:
             # self.get_save_pkgbuild_generates()
@@ -419,10 +620,14 @@ class Build(RedisHash):
         return False
 
     def _build_iso(self):
+        with self._allocated_resources(4, 2048) as allocation:
+            return self._run_iso_build(allocation)
+
+    def _run_iso_build(self, allocation):
         # TODO: Rework this, possibly abstract away parts in common with self.build_package()
         own_status = 'Building {0}-{1} with mkarchiso.'.format(self._pkg_obj.pkgname,
                                                                self._pkg_obj.pkgver)
-        status.current_status = own_status
+        self._set_status(own_status)
         status.iso_building = True
 
         i686_flag = os.path.join(status.REPO_BASE_DIR, 'iso/testing/.ISO32')
@@ -442,7 +647,7 @@ class Build(RedisHash):
             if os.path.exists(minimal):
                 os.remove(minimal)
 
-        doc_util.do_docker_clean(self._pkg_obj.pkgname)
+        doc_util.do_docker_clean(self.container_name)
 
         in_dir_last = len(
             [name for name in os.listdir(os.path.join(status.REPO_BASE_DIR, 'iso/testing'))]
@@ -473,7 +678,7 @@ class Build(RedisHash):
                 "MaximumRetryCount": 2,
                 "Name": "on-failure"
             },
-            mem_limit='2G',
+            mem_limit='{0}M'.format(allocation.mem_mb),
             memswap_limit='-1'
         )
 
@@ -481,8 +686,8 @@ class Build(RedisHash):
 
         try:
             iso_container = doc.create_container("antergos/mkarchiso", command='/start/run.sh',
-                                                 name=self._pkg_obj.pkgname, host_config=hconfig,
-                                                 cpuset='0-3')
+                                                 name=self.container_name, host_config=hconfig,
+                                                 cpuset=allocation.cpuset)
             if iso_container.get('Warnings', False):
                 logger.error(iso_container.get('Warnings'))
         except Exception as err:
@@ -491,15 +696,17 @@ class Build(RedisHash):
             return False
 
         self.container = iso_container.get('Id')
-        status.container = self.container
 
         open(os.path.join(status.MKARCHISO_DIR, 'first-run'), 'a').close()
 
+        streamer = BuildOutputStreamer(self)
+
         try:
             doc.start(self.container)
             cont = self.container
-            stream_process = Process(target=self.publish_build_output)
-            stream_process.start()
+            started = time.time()
+            streamer.start()
+            monitor, usage = self._start_usage_monitor(cont)
             result = doc.wait(cont)
             inspect = doc.inspect_container(cont)
             restarting = (
@@ -516,6 +723,8 @@ class Build(RedisHash):
                             inspect.get('RestartCount', 0) != 2
                         )
 
+            self._save_resource_usage(started, monitor, usage)
+
             if inspect['State'].get('ExitCode', 1) != 0:
                 logger.error(
                     '[CONTAINER EXIT CODE] Container %s exited. Return code was %s',
@@ -523,6 +732,7 @@ class Build(RedisHash):
                     result
                 )
                 self.save_build_results(False)
+                streamer.finish()
                 return False
 
             else:
@@ -534,14 +744,16 @@ class Build(RedisHash):
 
         except Exception as err:
             logger.error('Start container failed. Error Msg: %s', err)
+            streamer.cancel()
             self.save_build_results(False)
+            streamer.finish(timeout=30)
             return False
 
-        stream_process.join()
+        streamer.join()
 
         if not self.failed:
             remove(status.ANTERGOS_ISO_DIR)
-            doc_util.do_docker_clean(self._pkg_obj.pkgname)
+            doc_util.do_docker_clean(self.container_name)
 
         in_dir = len(
             [name for name in os.listdir(os.path.join(status.REPO_BASE_DIR, 'iso/testing'))]
@@ -549,12 +761,69 @@ class Build(RedisHash):
 
         if in_dir > in_dir_last:
             self.save_build_results(True)
+            streamer.finish()
             return True
         else:
             self.save_build_results(False)
+            streamer.finish()
             return False
 
 
+class BuildOutputStreamer:
+    """
+    Runs `Build.publish_build_output` in a thread inside the job's process (instead of a
+    forked process, which would share the job's redis and docker connections). The stream ends
+    by itself when the container exits. The build hands off its final result through `finish()`
+    once it is known.
+
+    Args:
+        bld_obj (Build): The build.
+        container (str): Stream this container's log (default: the build's container).
+        save_log (bool): Save the output as the build's log.
+
+    """
+
+    def __init__(self, bld_obj, container=None, save_log=True):
+        self.bld_obj = bld_obj
+        self.container = container
+        self.save_log = save_log
+        self.archived = False
+        self.container_exited = threading.Event()
+
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        try:
+            self.archived = self.bld_obj.publish_build_output(
+                container=self.container, save_log=self.save_log, cancelled=self._cancelled
+            )
+        except Exception as err:
+            logger.exception(err)
+        finally:
+            self.container_exited.set()
+
+    def cancel(self):
+        """ Stop streaming (takes effect when the next chunk of output arrives). """
+        self._cancelled.set()
+
+    def finish(self, timeout=None):
+        """ Waits for the stream to end, then ends the build's live output (see `join()`). """
+        if self.join(timeout):
+            self.bld_obj.finish_build_output(self.archived)
+
+    def join(self, timeout=None):
+        """ Waits for the stream to end. Returns `False` if it timed out. """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        return self.container_exited.is_set() or self._thread is None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
 def get_build_object(pkg_obj=None, bnum=None, tnum=None, trans_obj=None):
     """
     Gets an existing build or creates a new one.
@@ -576,6 +845,61 @@ def get_build_object(pkg_obj=None, bnum=None, tnum=None, trans_obj=None):
     elif all([pkg_obj, bnum]):
         raise ValueError('Only one of [pkg_obj, bnum] can be given, not both.')
 
-    bld_obj = Build(pkg_obj=pkg_obj, bnum=bnum, tnum=tnum, trans_obj=trans_obj)
+    if bnum:
+        return get_or_create('build', bnum, lambda: Build(bnum=bnum))
+
+    bld_obj = Build(pkg_obj=pkg_obj, tnum=tnum, trans_obj=trans_obj)
+
+    return register('build', bld_obj.bnum, bld_obj)
+
+
+def get_build_objects(bnums, fields=None):
+    """
+    Gets many existing builds at once. The builds' data is fetched from the database
+    using pipelined requests and the returned objects serve reads from that snapshot.
+
+    Args:
+        bnums (list): Get the existing builds identified by these `bnum`s.
+        fields (list): Only load these fields (a projection). All fields when `None`.
+
+    Returns:
+        list: `Build` objects in the same order as `bnums` (falsey `bnum`s are skipped).
+
+    """
+
+    bnums = [bnum for bnum in bnums if bnum]
+    full_keys = ['antbs:build:{0}'.format(bnum) for bnum in bnums]
+    snapshots = Build.fetch_snapshots(full_keys, fields)
+
+    bld_objs = [
+        Build(bnum=bnum, snapshot=snapshot, snapshot_fields=snapshot_fields)
+        for bnum, (snapshot, snapshot_fields) in zip(bnums, snapshots)
+    ]
+
+    return [register('build', bnum, bld_obj) for bnum, bld_obj in zip(bnums, bld_objs)]
+
+
+def expire_build_logs(retention_days=LOG_RETENTION_DAYS):
+    """
+    Removes the logs of builds that were archived more than `retention_days` ago from redis
+    (`compressed_log`, `log` and `log_str`). Only the archived copy of their log is kept.
+
+    """
+
+    cutoff = time.time() - retention_days * 86400
+    bnums = Build.db.zrangebyscore(LOG_RETENTION_KEY, '-inf', cutoff)
+
+    if not bnums:
+        return
+
+    pipe = Build.db.pipeline()
+
+    for bnum in bnums:
+        full_key = 'antbs:build:{0}'.format(bnum)
+        compressed_log = CompressedLog('{0}:compressed_log'.format(full_key))
+
+        pipe.delete(compressed_log.chunks_key, compressed_log.index_key, '{0}:log'.format(full_key))
+        pipe.hdel(full_key, 'log_str')
 
-    return bld_obj
+    pipe.zrem(LOG_RETENTION_KEY, *bnums)
+    pipe.execute()
@@ -0,0 +1,371 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# build_log.py
+#
+# Copyright © 2013-2017 Antergos
+#
+# This file is part of The Antergos Build Server, (AntBS).
+#
+# AntBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# AntBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# The following additional terms are in effect as per Section 7 of the license:
+#
+# The preservation of all legal notices and author attributions in
+# the material or in the Appropriate Legal Notices displayed
+# by works containing it is required.
+#
+# You should have received a copy of the GNU General Public License
+# along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+""" Compressed storage for build logs (in redis and in an on-disk archive). """
+
+import bisect
+import mmap
+import os
+import struct
+import zlib
+
+from . import binary_db
+
+
+class _LogWriter:
+    """
+    Base class for the log writers. Lines are added one at a time and grouped into zlib
+    compressed chunks of about `chunk_size` bytes of text, so only one chunk is held in memory.
+    Use writers as context managers: the log is only replaced when the block exits without an
+    exception (it is discarded otherwise).
+
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.total = 0
+        self._lines = []
+        self._chunk_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def _abort(self):
+        raise NotImplementedError
+
+    def _finish(self):
+        raise NotImplementedError
+
+    def _flush(self):
+        if not self._lines:
+            return
+
+        first_line = self.total - len(self._lines)
+        chunk = zlib.compress('\n'.join(self._lines).encode('UTF-8'))
+        self._lines, self._chunk_bytes = [], 0
+
+        self._write_chunk(first_line, chunk)
+
+    def _write_chunk(self, first_line, chunk):
+        raise NotImplementedError
+
+    def add(self, line):
+        self._lines.append(line)
+        self._chunk_bytes += len(line) + 1
+        self.total += 1
+
+        if self._chunk_bytes >= self.chunk_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._finish()
+
+
+class _CompressedLogWriter(_LogWriter):
+    # Chunks are pushed to temporary keys as they are completed and renamed at the end.
+
+    def __init__(self, log):
+        super().__init__(log.chunk_size)
+
+        self.log = log
+        self.tmp_chunks_key = '{0}:tmp'.format(log.chunks_key)
+        self.tmp_index_key = '{0}:tmp'.format(log.index_key)
+
+        self.log.db.delete(self.tmp_chunks_key, self.tmp_index_key)
+
+    def _abort(self):
+        self.log.db.delete(self.tmp_chunks_key, self.tmp_index_key)
+
+    def _finish(self):
+        pipe = self.log.db.pipeline()
+        pipe.rpush(self.tmp_index_key, self.total)
+        pipe.rename(self.tmp_index_key, self.log.index_key)
+
+        if self.total:
+            pipe.rename(self.tmp_chunks_key, self.log.chunks_key)
+        else:
+            pipe.delete(self.log.chunks_key)
+
+        pipe.execute()
+
+    def _write_chunk(self, first_line, chunk):
+        pipe = self.log.db.pipeline(transaction=False)
+        pipe.rpush(self.tmp_chunks_key, chunk)
+        pipe.rpush(self.tmp_index_key, first_line)
+        pipe.execute()
+
+
+class _LogArchiveWriter(_LogWriter):
+    # The files are written under temporary names and renamed at the end (the index last),
+    # so readers never see a partially written log.
+
+    def __init__(self, archive, bnum):
+        super().__init__(archive.chunk_size)
+
+        self.record = archive.record
+        self.log_path, self.idx_path = archive._get_paths(bnum)
+        self.size = 0
+
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+
+        self.log_file = open(self.log_path + '.tmp', 'wb')
+        self.idx_file = open(self.idx_path + '.tmp', 'wb')
+
+    def _abort(self):
+        self.log_file.close()
+        self.idx_file.close()
+
+        for path in [self.log_path + '.tmp', self.idx_path + '.tmp']:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _finish(self):
+        self.idx_file.write(self.record.pack(self.total, self.size))
+        self.log_file.close()
+        self.idx_file.close()
+
+        os.replace(self.log_path + '.tmp', self.log_path)
+        os.replace(self.idx_path + '.tmp', self.idx_path)
+
+    def _write_chunk(self, first_line, chunk):
+        self.idx_file.write(self.record.pack(first_line, self.size))
+        self.log_file.write(chunk)
+        self.size += len(chunk)
+
+
+def _decompress_chunk(chunk):
+    return zlib.decompress(chunk).decode('UTF-8').split('\n')
+
+
+class CompressedLog:
+    """
+    A build log stored in redis as zlib compressed chunks of about `chunk_size` bytes of
+    text each, plus an index with the number of the first line in each chunk. Reading a range
+    of lines only fetches and decompresses the chunks that hold them.
+
+    Keys:
+        <full_key>:chunks  A list of the compressed chunks.
+        <full_key>:index   A list of line offsets: the first line of each chunk followed by
+                           the total number of lines.
+
+    Args:
+        full_key (str): The log's key (eg. `antbs:build:1234:compressed_log`).
+        chunk_size (int): Target size (uncompressed) of each chunk in bytes.
+
+    """
+
+    db = binary_db
+
+    def __init__(self, full_key, chunk_size=65536):
+        self.full_key = full_key
+        self.chunk_size = chunk_size
+        self.chunks_key = '{0}:chunks'.format(full_key)
+        self.index_key = '{0}:index'.format(full_key)
+
+    def __bool__(self):
+        return bool(self.db.exists(self.index_key))
+
+    def __iter__(self):
+        offsets = self._get_offsets()
+
+        for chunk_num in range(len(offsets) - 1):
+            yield from self._get_chunks(chunk_num, chunk_num)[0]
+
+    def __len__(self):
+        total = self.db.lindex(self.index_key, -1)
+        return int(total) if total else 0
+
+    def _get_chunks(self, first, last):
+        return [_decompress_chunk(chunk) for chunk in self.db.lrange(self.chunks_key, first, last)]
+
+    def _get_offsets(self):
+        return [int(offset) for offset in self.db.lrange(self.index_key, 0, -1)]
+
+    def delete(self):
+        self.db.delete(self.chunks_key, self.index_key)
+
+    def get_lines(self, start=0, stop=None):
+        """
+        Returns the lines from `start` up to (but not including) `stop` (same as slicing a list,
+        negative indexes are not supported).
+
+        """
+
+        offsets = self._get_offsets()
+        total = offsets[-1] if offsets else 0
+        stop = total if stop is None else min(stop, total)
+
+        if start >= stop:
+            return []
+
+        first = bisect.bisect_right(offsets, start) - 1
+        last = bisect.bisect_right(offsets, stop - 1) - 1
+        lines = [line for chunk in self._get_chunks(first, last) for line in chunk]
+        base = offsets[first]
+
+        return lines[start - base:stop - base]
+
+    def write(self, lines):
+        """ Replaces the log's contents with `lines`. """
+        with self.writer() as writer:
+            for line in lines:
+                writer.add(line)
+
+    def writer(self):
+        """
+        Returns a writer (a context manager) that replaces the log's contents with the lines
+        passed to its `add()` method, one chunk at a time.
+
+        """
+
+        return _CompressedLogWriter(self)
+
+
+class LogArchive:
+    """
+    An append-only, on-disk archive of build logs. Each build's log is stored in two files:
+
+        <directory>/<bnum // 1000>/<bnum>.log  zlib compressed chunks of about `chunk_size`
+                                              bytes of text each, back to back.
+        <directory>/<bnum // 1000>/<bnum>.idx  Fixed-width records (two little-endian uint64):
+                                              the first line and byte offset of each chunk,
+                                              followed by the total number of lines and the
+                                              size of the log file.
+
+    Reads memory-map both files and binary search the index, so only the chunks that hold the
+    requested lines are read and decompressed, no matter how big the log is.
+
+    Args:
+        directory (str): The archive's directory (default: ANTBS_LOG_ARCHIVE_DIR or
+                         /var/log/antbs/builds).
+        chunk_size (int): Target size (uncompressed) of each chunk in bytes.
+
+    """
+
+    record = struct.Struct('<QQ')
+
+    def __init__(self, directory=None, chunk_size=65536):
+        if directory is None:
+            directory = os.environ.get('ANTBS_LOG_ARCHIVE_DIR', '/var/log/antbs/builds')
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+    def _get_paths(self, bnum):
+        base = os.path.join(self.directory, str(int(bnum) // 1000), str(bnum))
+        return base + '.log', base + '.idx'
+
+    def _read_record(self, index, num):
+        return self.record.unpack_from(index, num * self.record.size)
+
+    def _find_chunk(self, index, num_chunks, line):
+        low, high = 0, num_chunks - 1
+
+        while low < high:
+            mid = (low + high + 1) // 2
+
+            if self._read_record(index, mid)[0] <= line:
+                low = mid
+            else:
+                high = mid - 1
+
+        return low
+
+    def exists(self, bnum):
+        return os.path.exists(self._get_paths(bnum)[1])
+
+    def get_length(self, bnum):
+        """ Returns the number of lines in a build's archived log (0 if it's not archived). """
+        _, idx_path = self._get_paths(bnum)
+
+        try:
+            with open(idx_path, 'rb') as idx_file:
+                idx_file.seek(-self.record.size, os.SEEK_END)
+                return self.record.unpack(idx_file.read(self.record.size))[0]
+        except OSError:
+            return 0
+
+    def get_lines(self, bnum, start=0, stop=None):
+        """
+        Returns the lines of a build's archived log from `start` up to (but not including)
+        `stop` (same as slicing a list, negative indexes are not supported).
+
+        """
+
+        log_path, idx_path = self._get_paths(bnum)
+
+        if not os.path.exists(idx_path):
+            return []
+
+        with open(idx_path, 'rb') as idx_file, \
+                mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            num_chunks = len(index) // self.record.size - 1
+            total = self._read_record(index, num_chunks)[0]
+            stop = total if stop is None else min(stop, total)
+
+            if start >= stop:
+                return []
+
+            first = self._find_chunk(index, num_chunks, start)
+            last = self._find_chunk(index, num_chunks, stop - 1)
+            records = [self._read_record(index, num) for num in range(first, last + 2)]
+
+        lines = []
+
+        with open(log_path, 'rb') as log_file, \
+                mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for (_, offset), (_, end) in zip(records, records[1:]):
+                lines.extend(_decompress_chunk(data[offset:end]))
+
+        base = records[0][0]
+
+        return lines[start - base:stop - base]
+
+    def write(self, bnum, lines):
+        """ Archives a build's log (replacing any archived log for the build). """
+        with self.writer(bnum) as writer:
+            for line in lines:
+                writer.add(line)
+
+    def writer(self, bnum):
+        """
+        Returns a writer (a context manager) that archives the lines passed to its `add()`
+        method as a build's log, one chunk at a time.
+
+        """
+
+        return _LogArchiveWriter(self, bnum)
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# identity_map.py
+#
+# Copyright © 2013-2017 Antergos
+#
+# This file is part of The Antergos Build Server, (AntBS).
+#
+# AntBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# AntBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# The following additional terms are in effect as per Section 7 of the license:
+#
+# The preservation of all legal notices and author attributions in
+# the material or in the Appropriate Legal Notices displayed
+# by works containing it is required.
+#
+# You should have received a copy of the GNU General Public License
+# along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Identity maps for the objects returned by the `get_*_object()` factory functions.
+
+Within a single web request (or RQ job), an identity map ensures that each object is loaded
+from the database at most once. The map is stored on Flask's `g` during requests. Jobs use
+the `job_identity_map` decorator (or the `identity_map_scope()` context manager) to get a
+map of their own. Outside of both, every call creates a new object (no caching).
+
+"""
+
+import contextlib
+import functools
+import threading
+
+from flask import g, has_app_context
+
+# With gevent's monkey patching, this is local to the greenlet.
+_job_scope = threading.local()
+
+
+def _get_registry():
+    registry = getattr(_job_scope, 'registry', None)
+
+    if registry is None and has_app_context():
+        if 'identity_map' not in g:
+            g.identity_map = {}
+
+        registry = g.identity_map
+
+    return registry
+
+
+@contextlib.contextmanager
+def identity_map_scope():
+    """ Use an identity map for the duration of the block (nested blocks share the map). """
+    outer = getattr(_job_scope, 'registry', None)
+    _job_scope.registry = {} if outer is None else outer
+
+    try:
+        yield _job_scope.registry
+    finally:
+        _job_scope.registry = outer
+
+
+def job_identity_map(func):
+    """ Decorator that runs `func` (usually an RQ job) with its own identity map. """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with identity_map_scope():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def get_or_create(obj_type, key, factory, refresh=False):
+    """
+    Returns the object identified by `obj_type` and `key` from the current identity map.
+    If it's not there yet, it's created with `factory()` and added to the map.
+
+    Args:
+        obj_type (str):     The type of the object (a namespace for `key`).
+        key (str|int):      The object's key.
+        factory (callable): Creates the object.
+        refresh (bool):     Always create a new object (replacing the one in the map).
+
+    """
+
+    registry = _get_registry()
+
+    if registry is None:
+        return factory()
+
+    ident = (obj_type, str(key))
+    obj = None if refresh else registry.get(ident)
+
+    if obj is None:
+        obj = registry[ident] = factory()
+
+    return obj
+
+
+def register(obj_type, key, obj):
+    """
+    Adds `obj` to the current identity map unless it already holds an object for `key`. In
+    that case, if `obj` has a snapshot (see `RedisHash.load_snapshot`) and the object in the
+    map doesn't, the object in the map gets `obj`'s snapshot (so the data isn't fetched again).
+
+    Returns:
+        The object from the identity map (`obj` when there is no map).
+
+    """
+
+    registry = _get_registry()
+
+    if registry is None:
+        return obj
+
+    existing = registry.setdefault((obj_type, str(key)), obj)
+
+    if existing is not obj and obj.has_snapshot and not existing.has_snapshot:
+        existing.set_snapshot(obj._snapshot, obj._snapshot_fields)
+
+    return existing
@@ -59,18 +59,21 @@ class AntergosInstallation(RedisHash, DateTimeStrings):
         self.__namespaceinit__()
 
         if not self or not self.install_id:
-            self.install_id = install_id
-            self.ip_address = ip
-            dt = datetime.datetime.now()
-            self.start_date = self.dt_date_to_string(dt)
-            self.start_time = self.dt_time_to_string(dt)
-            self.start_str = self.dt_to_string(dt)
+            with self.batch():
+                self.install_id = install_id
+                self.ip_address = ip
+                dt = datetime.datetime.now()
+                self.start_date = self.dt_date_to_string(dt)
+                self.start_time = self.dt_time_to_string(dt)
+                self.start_str = self.dt_to_string(dt)
 
     def set_installation_ended(self):
         dt = datetime.datetime.now()
-        self.end_date = self.dt_date_to_string(dt)
-        self.end_time = self.dt_time_to_string(dt)
-        self.end_str = self.dt_to_string(dt)
+
+        with self.batch():
+            self.end_date = self.dt_date_to_string(dt)
+            self.end_time = self.dt_time_to_string(dt)
+            self.end_str = self.dt_to_string(dt)
 
 
 class AntergosInstallationUser(RedisHash):
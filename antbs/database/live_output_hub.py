@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# live_output_hub.py
+#
+# Copyright © 2013-2017 Antergos
+#
+# This file is part of The Antergos Build Server, (AntBS).
+#
+# AntBS is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# AntBS is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# The following additional terms are in effect as per Section 7 of the license:
+#
+# The preservation of all legal notices and author attributions in
+# the material or in the Appropriate Legal Notices displayed
+# by works containing it is required.
+#
+# You should have received a copy of the GNU General Public License
+# along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+""" Per-process fan-out of live build output (redis streams) to many clients. """
+
+import contextlib
+import re
+
+import gevent
+from gevent.queue import Queue, Full, Empty
+
+from utils import LIVE_OUTPUT_MAX_LINES
+
+from . import db, pubsub_db, Singleton
+from .status import status
+
+logger = status.logger
+ENTRY_ID_RE = re.compile(r'^\d+-\d+$')
+
+
+def _entry_id_key(entry_id):
+    return tuple(int(part) for part in entry_id.split('-'))
+
+
+def _parse_entries(entries):
+    parsed = []
+
+    for entry_id, fields in entries or []:
+        if not isinstance(fields, dict):
+            # Newer clients parse the fields into a dict, older ones return a flat list.
+            fields = dict(zip(fields[::2], fields[1::2]))
+
+        parsed.append((entry_id, fields.get('lines', '')))
+
+    return parsed
+
+
+class LiveOutputHub(metaclass=Singleton):
+    """
+    Fans out the entries added to redis streams to any number of clients in this process.
+    There is at most one reader (a blocking `XREAD` loop) per stream, no matter how many
+    clients are following it. It is started when the first client subscribes and stopped
+    when the last client unsubscribes.
+
+    Each client gets a bounded queue. When a client can't keep up and its queue is full, the
+    oldest entry in the queue is dropped to make room, so slow clients never hold up the
+    others. Clients that reconnect catch up from the stream itself (see `follow`).
+
+    Args:
+        queue_size (int): The maximum number of entries queued for each client.
+        block_ms (int):   How long each `XREAD` blocks waiting for new entries.
+
+    """
+
+    def __init__(self, queue_size=500, block_ms=15000):
+        self.queue_size = queue_size
+        self.block_ms = block_ms
+        self._streams = {}
+
+    @staticmethod
+    def is_valid_entry_id(entry_id):
+        return bool(entry_id and ENTRY_ID_RE.match(entry_id))
+
+    def _deliver(self, key, entry):
+        for client in list(self._streams[key]['clients']):
+            while True:
+                try:
+                    client.put_nowait(entry)
+                    break
+                except Full:
+                    try:
+                        client.get_nowait()
+                    except Empty:
+                        pass
+
+    def _listen(self, key, last_id):
+        # The reader holds its own connection. It is never returned to the pool while a
+        # blocking read is in flight (the reader is killed when the last client leaves).
+        pool = pubsub_db.connection_pool
+        conn = None
+
+        try:
+            while True:
+                try:
+                    if conn is None:
+                        conn = pool.get_connection('XREAD')
+
+                    conn.send_command('XREAD', 'BLOCK', self.block_ms, 'COUNT', self.queue_size,
+                                      'STREAMS', key, last_id)
+                    response = conn.read_response()
+
+                except Exception as err:
+                    logger.error(err)
+
+                    if conn is not None:
+                        conn.disconnect()
+                        pool.release(conn)
+                        conn = None
+
+                    gevent.sleep(1)
+                    continue
+
+                if isinstance(response, dict):
+                    response = response.items()
+
+                for _, entries in response or []:
+                    for entry in _parse_entries(entries):
+                        self._deliver(key, entry)
+                        last_id = entry[0]
+
+        finally:
+            if conn is not None:
+                conn.disconnect()
+                pool.release(conn)
+
+    def _start_stream(self, key):
+        info = self._streams[key] = dict(clients=set(), reader=None)
+
+        try:
+            last = db.execute_command('XREVRANGE', key, '+', '-', 'COUNT', 1)
+        except Exception:
+            self._streams.pop(key, None)
+            raise
+
+        last_id = last[0][0] if last else '0-0'
+        info['reader'] = gevent.spawn(self._listen, key, last_id)
+
+    @contextlib.contextmanager
+    def subscribe(self, key):
+        """
+        Context manager that subscribes a new client to the stream at `key`. Only entries
+        added after the client subscribed are delivered to it.
+
+        Yields:
+            gevent.queue.Queue: The client's queue. Entries (`tuple(entry_id, lines)`) can be
+                                taken from it with a blocking `get()`.
+
+        """
+
+        client = Queue(maxsize=self.queue_size)
+
+        if key not in self._streams:
+            self._start_stream(key)
+
+        info = self._streams[key]
+        info['clients'].add(client)
+
+        try:
+            yield client
+        finally:
+            info['clients'].discard(client)
+
+            if not info['clients']:
+                if self._streams.get(key) is info:
+                    del self._streams[key]
+
+                info['reader'].kill()
+
+    def get_backlog(self, key, after=None, max_lines=LIVE_OUTPUT_MAX_LINES):
+        """
+        Returns the entries in the stream at `key` (all of them or those after `after`). Only
+        the newest entries that hold up to `max_lines` lines in total are returned (at least
+        one entry), so a client that (re)connects to a long build gets the tail of its output.
+
+        Returns:
+            list: `tuple(entry_id, lines)` for each entry (`lines` is a newline separated string).
+
+        """
+
+        backlog, num_lines, end = [], 0, '+'
+
+        # Pages of entries are read from the newest to the oldest until the budget is used up.
+        while num_lines < max_lines:
+            page = db.execute_command(
+                'XREVRANGE', key, end, after or '-', 'COUNT', self.queue_size
+            )
+            entries = _parse_entries(page)
+
+            if '+' != end and entries and entries[0][0] == end:
+                entries = entries[1:]
+
+            if after and entries and entries[-1][0] == after:
+                entries = entries[:-1]
+
+            for entry in entries:
+                entry_lines = entry[1].count('\n') + 1
+
+                if backlog and num_lines + entry_lines > max_lines:
+                    num_lines = max_lines
+                    break
+
+                backlog.append(entry)
+                num_lines += entry_lines
+
+            if num_lines >= max_lines or not entries or len(page) < self.queue_size:
+                break
+
+            end = entries[-1][0]
+
+        return backlog[::-1]
+
+    def follow(self, key, last_event_id=None, keep_alive=28):
+        """
+        Generator that yields the entries in the stream at `key`: first the backlog (the
+        entries after `last_event_id`, or all of them, see `get_backlog`), then new entries as
+        they are added.
+        No entries are skipped or repeated between the two.
+
+        Args:
+            key (str):           The stream's key.
+            last_event_id (str): ID of the last entry the client already has.
+            keep_alive (int):    Seconds after which `None` is yielded if there were no new
+                                 entries (so the caller can keep its connection alive).
+
+        Yields:
+            tuple|None: `tuple(entry_id, lines)` for each entry (`lines` is a newline separated string).
+
+        """
+
+        if not self.is_valid_entry_id(last_event_id):
+            last_event_id = None
+
+        with self.subscribe(key) as entries:
+            last_seen = last_event_id
+
+            for entry in self.get_backlog(key, after=last_event_id):
+                last_seen = entry[0]
+                yield entry
+
+            last_seen = _entry_id_key(last_seen) if last_seen else (-1, -1)
+
+            while True:
+                try:
+                    entry = entries.get(timeout=keep_alive)
+                except Empty:
+                    yield None
+                    continue
+
+                if _entry_id_key(entry[0]) <= last_seen:
+                    continue
+
+                last_seen = _entry_id_key(entry[0])
+                yield entry
+
+    def stats(self):
+        """ Returns the number of clients for each stream that is being read. """
+        return {key: len(info['clients']) for key, info in self._streams.items()}
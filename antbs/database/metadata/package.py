@@ -119,12 +119,15 @@ class PackageMetadata(RedisHash):
 
         if (not self or not self.pkg_id) and self.is_package_on_github(name=key):
             # Package is not in the database, so it must be new. Let's initialize it.
-            self.pkgname = key
-            self.name = key
-
-            self.pkg_id = self.db.incr('antbs:misc:pkgid:next')
-
-            status.all_packages.add(self.name)
+            self.create_object(
+                full_key=self.full_key,
+                id_field='pkg_id',
+                counter_key='antbs:misc:pkgid:next',
+                fields=dict(pkgname=key, name=key),
+                add_to_sets={status.all_packages.full_key: key},
+            )
+
+            self.refresh_snapshot()
 
     def is_package_on_github(self, name=None):
         raise NotImplementedError('Subclass must implement this method')
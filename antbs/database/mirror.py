@@ -38,6 +38,7 @@ from utils import (
 )
 
 from database.base_objects import RedisHash
+from database.build import BuildOutputStreamer
 from database.status import status
 
 doc_util = DockerUtils(status)
@@ -284,13 +285,12 @@ class RepoMirror(RedisHash):
             bld_obj.repo_container = cont
             doc.start(cont)
             if not review_result:
-                stream_process = Process(target=bld_obj.publish_build_output,
-                                         kwargs=dict(upd_repo=True))
-                stream_process.start()
+                streamer = BuildOutputStreamer(bld_obj, container=cont, save_log=False)
+                streamer.start()
 
             result = doc.wait(cont)
             if not review_result:
-                stream_process.join()
+                streamer.join()
 
             if int(result) != 0:
                 logger.error('update repo failed. exit status is: %s', result)
@@ -46,7 +46,9 @@ from . import (
     RedisHash,
     status,
     get_pkg_object,
-    get_repo_object
+    get_pkg_objects,
+    get_repo_object,
+    job_identity_map
 )
 
 from utils import (
@@ -170,7 +172,7 @@ class Monitor(RedisHash):
         return build_override, latest
 
     def _sync_packages_list(self):
-        pkg_objs = [get_pkg_object(name=p) for p in status.all_packages if p]
+        pkg_objs = get_pkg_objects(status.all_packages, fields=['is_monitored'])
         monitored = [p.pkgname for p in pkg_objs if p.is_monitored]
         new_pkgs = list(set(monitored) - set(list(self.packages)))
         rm_pkgs = list(set(list(self.packages)) - set(monitored))
@@ -428,6 +430,7 @@ def get_monitor_object(name):
     return monitor_obj
 
 
+@job_identity_map
 def check_repos_for_changes(check_github, sync_repos, webhook):
     monitor_obj = get_monitor_object('github')
 
@@ -37,11 +37,15 @@ from utils import Pkgbuild
 from . import (
     status
 )
+from .identity_map import get_or_create, register
 
 logger = status.logger
 REPO_DIR = status.PKGBUILDS_DIR
 GITLAB_TOKEN = status.gitlab_token
 
+# Fields that are read while initializing a `Package` object.
+INIT_FIELDS = ['pkg_id', 'pkgname', 'gh_path', 'pkgbuild', 'is_initialized']
+
 
 class Package(PackageMetadata):
     """
@@ -102,8 +106,8 @@ class Package(PackageMetadata):
         url               (str):  See `man PKGBUILD`.
         version_str       (str):  The full version suituble for display on the frontend.
     """
-    def __init__(self, name, fetch_pkgbuild=False):
-        super().__init__(key=name)
+    def __init__(self, name, fetch_pkgbuild=False, snapshot=None, snapshot_fields=None):
+        super().__init__(key=name, snapshot=snapshot, snapshot_fields=snapshot_fields)
 
         self._pkgbuild = None
 
@@ -561,6 +565,39 @@ class Package(PackageMetadata):
 
 
 def get_pkg_object(name, fetch_pkgbuild=False):
-    pkg_obj = Package(name=name, fetch_pkgbuild=fetch_pkgbuild)
+    def factory():
+        return Package(name=name, fetch_pkgbuild=fetch_pkgbuild)
+
+    # Fetching the PKGBUILD syncs the database with it, so that always needs a new object.
+    return get_or_create('pkg', name, factory, refresh=fetch_pkgbuild)
+
+
+def get_pkg_objects(names, fields=None):
+    """
+    Gets many existing packages at once. The packages' data is fetched from the database
+    using pipelined requests and the returned objects serve reads from that snapshot.
+
+    Args:
+        names (list): Names of the packages.
+        fields (list): Only load these fields (a projection). All fields when `None`.
+                       The fields needed to initialize a package are always loaded.
+
+    Returns:
+        list: `Package` objects in the same order as `names` (falsey names are skipped).
+
+    """
+
+    names = [name for name in names if name]
+    full_keys = ['antbs:pkg:{0}'.format(name) for name in names]
+
+    if fields is not None:
+        fields = list(set(fields) | set(INIT_FIELDS))
+
+    snapshots = Package.fetch_snapshots(full_keys, fields)
+
+    pkg_objs = [
+        Package(name=name, snapshot=snapshot, snapshot_fields=snapshot_fields)
+        for name, (snapshot, snapshot_fields) in zip(names, snapshots)
+    ]
 
-    return pkg_obj
+    return [register('pkg', name, pkg_obj) for name, pkg_obj in zip(names, pkg_objs)]
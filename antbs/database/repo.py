@@ -152,7 +152,7 @@ class PacmanRepo(PacmanRepoMetadata):
         return _pkgvers
 
     def _determine_current_repo_state_alpm(self):
-        self.pkgs_alpm.remove_range(0, -1)
+        pkgs_alpm = []
 
         try:
             with tarfile.open(self.alpm_db_path, 'r') as alpm_db:
@@ -165,8 +165,9 @@ class PacmanRepo(PacmanRepoMetadata):
 
                     pkgname, ver, rel, arch, suffix = pkg_file_name.rsplit('-', 4)
 
-                    self.pkgs_alpm.add('{0}|{1}-{2}|{3}'.format(pkgname, ver, rel, arch))
+                    pkgs_alpm.append('{0}|{1}-{2}|{3}'.format(pkgname, ver, rel, arch))
 
+            self.pkgs_alpm.replace_all(pkgs_alpm)
             self.pkg_count_alpm = len(self.pkgs_alpm)
 
         except Exception as err:
@@ -176,7 +177,7 @@ class PacmanRepo(PacmanRepoMetadata):
         self._maybe_remove_broken_symlinks()
         pkgs = [p for p in os.listdir(self.path) if '.pkg.' in p and not p.endswith('.sig')]
 
-        self.pkgs_fs.remove_range(0, -1)
+        pkgs_fs = []
 
         for pkg_file_name in pkgs:
             pkg_file_name = pkg_file_name.replace('.pkg', '-pkg')
@@ -187,8 +188,9 @@ class PacmanRepo(PacmanRepoMetadata):
                 logger.error("unexpected pkg: " + pkg_file_name)
                 continue
 
-            self.pkgs_fs.add('{0}|{1}-{2}|{3}'.format(pkg, version, rel, arch))
+            pkgs_fs.append('{0}|{1}-{2}|{3}'.format(pkg, version, rel, arch))
 
+        self.pkgs_fs.replace_all(pkgs_fs)
         self.pkg_count_fs = len(self.pkgs_fs)
 
     def _get_packages_unaccounted_for_info(self):
@@ -247,18 +249,9 @@ class PacmanRepo(PacmanRepoMetadata):
 
         # logger.debug([unaccounted_for])
 
-        self.packages.remove_range(0, -1)
-        self.unaccounted_for.remove_range(0, -1)
-        self.pkgnames.remove_range(0, -1)
-
-        for pkg in accounted_for:
-            self.packages.add(pkg)
-
-        for pkg in unaccounted_for:
-            self.unaccounted_for.add(pkg)
-
-        for pkg in self._get_pkgnames(accounted_for):
-            self.pkgnames.append(pkg)
+        self.packages.replace_all(accounted_for)
+        self.unaccounted_for.replace_all(unaccounted_for)
+        self.pkgnames.replace_all(self._get_pkgnames(accounted_for))
 
     def _process_repo_packages_data(self):
         unaccounted_for = self._get_packages_unaccounted_for_info()
@@ -31,17 +31,30 @@
 
 import datetime
 import contextlib
+import os
+import time
 
-from . import RedisHash, Singleton, RedisSingleton
+import gevent
+
+from . import RedisHash, Singleton, RedisSingleton, pubsub_db
 from logging_config import get_logger_object
 from utils import DateTimeStrings
 
 
 class ServerStatus(RedisHash, metaclass=RedisSingleton):
+    """
+    The application's state. In web processes, reads of the hash fields are served from an
+    in-process cache (a snapshot of the hash) which is dropped whenever any process writes to
+    the hash (writes are published on `changes_channel`). The cache is also reloaded when it
+    is older than `cache_max_age` seconds, in case a notification was missed.
+
+    The cache is only enabled when ANTBS_PROCESS_ROLE is explicitly set to `web`: its listener
+    is a greenlet, which never runs in processes that aren't monkey patched (eg. RQ workers).
+
+    """
 
     attrib_lists = dict(
-        string=['current_status', 'container', 'github_token',
-                'gitlab_token', 'building_start', 'building_num', 'docker_user',
+        string=['current_status', 'github_token', 'gitlab_token', 'docker_user',
                 'docker_password', 'gpg_key', 'gpg_password', 'wp_password',
                 'bugsnag_key', 'sp_session_key', 'sp_api_id', 'sp_api_key',
                 'sp_app', 'gh_repo_url', 'request_from', 'ANTERGOS_API_DB_KEY_NAME',
@@ -53,7 +66,7 @@ class ServerStatus(RedisHash, metaclass=RedisSingleton):
               'docker_image_building', 'repo_locked_antergos', 'repo_locked_staging',
               'debug_toolbar_enabled', 'repos_synced_recently', 'repos_syncing'],
 
-        int=['building_num'],
+        int=[],
 
         list=['completed', 'failed', 'transaction_queue', 'pending_review',
               'all_tl_events', 'build_queue', 'transactions_running', 'now_building'],
@@ -68,8 +81,15 @@ class ServerStatus(RedisHash, metaclass=RedisSingleton):
               'ISO_TRANSLATIONS_DESTDIR', 'ANTERGOS_ISO_DIR']
     )
     can_expire = ['repos_synced_recently']
+    indexed_lists = ['completed', 'failed', 'now_building']
+    changes_channel = 'antbs:status:changes'
     logger = None
 
+    cache_enabled = False
+    cache_max_age = 5
+    _cache_loaded_at = 0
+    _cache_listener_pid = None
+
     def __init__(self, prefix='status', key='', *args, **kwargs):
         super().__init__(prefix=prefix, key=key, *args, **kwargs)
 
@@ -85,6 +105,46 @@ class ServerStatus(RedisHash, metaclass=RedisSingleton):
         if self.logger is None:
             self.logger = get_logger_object(self)
 
+        # Not `ROLE`, which defaults to `web` (for the pool sizes) when the variable isn't set.
+        self.cache_enabled = 'web' == os.environ.get('ANTBS_PROCESS_ROLE')
+
+    def _ensure_cache_listener(self):
+        # The listener must be (re)started in each process (gunicorn forks its workers).
+        if self._cache_listener_pid == os.getpid():
+            return
+
+        self._cache_listener_pid = os.getpid()
+        gevent.spawn(self._listen_for_changes)
+
+    def _listen_for_changes(self):
+        while True:
+            psub = pubsub_db.pubsub(ignore_subscribe_messages=True)
+
+            try:
+                psub.subscribe(self.changes_channel)
+                # Changes might have been missed while we were not subscribed.
+                self.drop_snapshot()
+
+                for _ in psub.listen():
+                    self.drop_snapshot()
+
+            except Exception as err:
+                self.logger.error(err)
+                gevent.sleep(5)
+
+            finally:
+                psub.close()
+
+    def snapshot_lookup(self, field):
+        if self.cache_enabled and not self.is_batching:
+            self._ensure_cache_listener()
+
+            if self._snapshot is None or time.time() - self._cache_loaded_at > self.cache_max_age:
+                self.load_snapshot()
+                self._cache_loaded_at = time.time()
+
+        return super().snapshot_lookup(field)
+
     def cleanup_all_packages_list(self, get_pkg_object):
         to_remove = []
 
@@ -116,30 +176,31 @@ class TimelineEvent(RedisHash, DateTimeStrings):
         path=[]
     )
 
-    def __init__(self, msg=None, tl_type=None, event_id=None, packages=None, tnum='', prefix='timeline'):
+    def __init__(self, msg=None, tl_type=None, event_id=None, packages=None, tnum='', prefix='timeline',
+                 snapshot=None):
         if not event_id and any(True for i in [msg, tl_type] if not i and 0 != i):
             raise ValueError('msg and tl_type required when event_id is not provided.')
 
         the_id = event_id
         if not event_id:
-            the_id = self.db.incr('antbs:misc:event_id:next')
-
-        super().__init__(prefix=prefix, key=the_id)
-        self.__namespaceinit__()
-
-        if not self or not self.event_id:
-            self.event_id = the_id
-            self.tnum = tnum
-            status.all_tl_events.append(self.event_id)
-            self.tl_type = tl_type
-            self.message = msg
             dt = datetime.datetime.now()
-            self.date_str = self.dt_date_to_string(dt)
-            self.time_str = self.dt_time_to_string(dt)
-            if packages:
-                packages = [p for p in packages if p]
-                for p in packages:
-                    self.packages.append(p)
+            the_id, _ = self.create_object(
+                full_key='antbs:{0}:{{id}}'.format(prefix),
+                id_field='event_id',
+                counter_key='antbs:misc:event_id:next',
+                fields=dict(
+                    tnum=tnum,
+                    tl_type=tl_type,
+                    message=msg,
+                    date_str=self.dt_date_to_string(dt),
+                    time_str=self.dt_time_to_string(dt),
+                ),
+                children=dict(packages=packages or []),
+                append_id_to=[status.all_tl_events.full_key],
+            )
+
+        super().__init__(prefix=prefix, key=the_id, snapshot=snapshot)
+        self.__namespaceinit__()
 
         if '/pkg/' in self.message:
             self.message = self.message.replace('/pkg/', '/package/')
@@ -151,4 +212,26 @@ def get_timeline_object(event_id=None, msg=None, tl_type=None, packages=None, re
         return tl_obj
 
 
+def get_timeline_objects(event_ids):
+    """
+    Gets many existing timeline events at once using pipelined requests.
+
+    Args:
+        event_ids (list): IDs of the timeline events.
+
+    Returns:
+        list: `TimelineEvent` objects in the same order as `event_ids` (falsey IDs are skipped).
+
+    """
+
+    event_ids = [event_id for event_id in event_ids if event_id]
+    full_keys = ['antbs:timeline:{0}'.format(event_id) for event_id in event_ids]
+    snapshots = TimelineEvent.fetch_snapshots(full_keys)
+
+    return [
+        TimelineEvent(event_id=event_id, snapshot=snapshot)
+        for event_id, (snapshot, _) in zip(event_ids, snapshots)
+    ]
+
+
 status = ServerStatus()
@@ -20,15 +20,23 @@
 # You should have received a copy of the GNU General Public License
 # along with AntBS; If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
+import itertools
 import os
 import shutil
+import socket
 import subprocess
 import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import gevent
 
 from rq import (
     Connection,
     Queue,
+    get_current_job,
 )
 
 from utils import (
@@ -36,6 +44,7 @@ from utils import (
     copy_or_symlink,
     try_run_command,
     DockerUtils,
+    FencedLock,
     PacmanPackageCache,
     remove
 )
@@ -47,6 +56,7 @@ from . import (
     status,
     get_repo_object
 )
+from .identity_map import get_or_create, register
 
 logger = status.logger
 doc_util = DockerUtils(status)
@@ -57,6 +67,18 @@ pkg_cache_obj = PacmanPackageCache()
 with Connection(status.db):
     repo_queue = Queue('update_repo')
 
+# Transactions waiting in `status.transaction_queue` are scored in this zset by the time they
+# were queued plus the delay of their priority class. Workers start the transaction with the
+# lowest score first, so a transaction waits behind higher priority ones for at most its
+# class' delay (it can't be starved by them).
+TRANSACTION_PRIORITIES_KEY = 'antbs:misc:transaction_priorities'
+TRANSACTION_WAIT_STATS_KEY = 'antbs:misc:transaction_wait_stats'
+PRIORITY_DELAYS = OrderedDict([
+    ('interactive', 0),
+    ('webhook', int(os.environ.get('ANTBS_WEBHOOK_PRIORITY_DELAY', 600))),
+    ('monitor', int(os.environ.get('ANTBS_MONITOR_PRIORITY_DELAY', 3600))),
+])
+
 
 class TransactionMeta(RedisHash):
     """
@@ -77,9 +99,10 @@ class TransactionMeta(RedisHash):
     _staging_repo32 = get_repo_object('antergos-staging', 'i686')
 
     attrib_lists = dict(
-        string=['building', 'start_str', 'end_str', 'initiated_by', 'gh_sha_before', 'gh_sha_after', 'gh_patch'],
+        string=['building', 'start_str', 'end_str', 'initiated_by', 'gh_sha_before', 'gh_sha_after', 'gh_patch',
+                'current_status', 'worker', 'priority'],
         bool=['is_running', 'is_finished', 'sync_pkgbuilds_only'],
-        int=['tnum'],
+        int=['tnum', 'queued_at', 'wait_seconds', 'coalesced'],
         list=['queue'],
         set=['packages', 'builds', 'completed', 'failed', 'generated_pkgs'],
         path=['base_path', 'path', 'result_dir', 'cache', 'cache_i686', 'upd_repo_result']
@@ -94,7 +117,17 @@ class TransactionMeta(RedisHash):
 
         the_tnum = tnum
         if not tnum:
-            the_tnum = self.db.incr('antbs:misc:tnum:next')
+            the_tnum, _ = self.create_object(
+                full_key='{0}:{1}:{{id}}'.format(namespace, prefix),
+                id_field='tnum',
+                counter_key='antbs:misc:tnum:next',
+                fields=dict(
+                    base_path=base_path,
+                    cache=pkg_cache_obj.cache,
+                    cache_i686=pkg_cache_obj.cache_i686,
+                ),
+                children=dict(packages=packages),
+            )
 
         super().__init__(namespace=namespace, prefix=prefix, key=the_tnum)
 
@@ -105,18 +138,6 @@ class TransactionMeta(RedisHash):
         self._build_dirpaths = {}
         self._pkgvers = {}
 
-        if not self or not self.tnum:
-            self.tnum = the_tnum
-            self.base_path = base_path
-            self.cache = pkg_cache_obj.cache
-            self.cache_i686 = pkg_cache_obj.cache_i686
-
-            if packages:
-                packages = [p for p in packages if p]
-
-                for pkg in packages:
-                    self.packages.add(pkg)
-
         for pkg in self.packages:
             self._build_dirpaths[pkg] = {'build_dir': '', '32bit': '', '32build': ''}
             self._pkgvers[pkg] = ''
@@ -142,96 +163,254 @@ class Transaction(TransactionMeta):
             is_running (bool): Whether or not the transaction is currently running.
             is_finished (bool): Whether or not the transaction is done (regardless of results)
             building (str): The name of the package currently building.
+            current_status (str): What the transaction is currently doing.
+            worker (str): The worker running the transaction (`hostname.pid`).
+            priority (str): The transaction's priority class (see `PRIORITY_DELAYS`).
+            queued_at (int): When the transaction was added to the queue (unix time).
+            wait_seconds (int): How long the transaction waited in the queue.
+            coalesced (int): How many requests for its packages were merged into it while it
+                             was waiting in the queue (see `queue_transaction`).
             start_str (str): The datetime string for when this transaction started.
             end_str (str): The datetime string for when this transaction ended.
             completed (list): Builds that completed successfully (list of bnums).
             failed (list): Builds that failed (list of bnums).
             internal_deps (list): List of packages that depend on package(s) in this transaction.
+            max_parallel_builds (int): How many of this transaction's builds can run at the same
+                                       time (ANTBS_MAX_PARALLEL_BUILDS, default: 2).
 
         Raises:
             ValueError: If both `packages` and `tnum` are Falsey.
     """
 
+    max_parallel_builds = int(os.environ.get('ANTBS_MAX_PARALLEL_BUILDS', 2))
+
+    def add_to_queue(self, priority='interactive', queued_at=None):
+        """
+        Adds the transaction to the queue. A `handle_hook` job must be enqueued for each
+        transaction that is added (the job runs whichever transaction is next).
+
+        Args:
+            priority (str): The transaction's priority class (one of `PRIORITY_DELAYS`).
+            queued_at (int): Keep the transaction's place in the queue (when it's put back).
+
+        """
+
+        if priority not in PRIORITY_DELAYS:
+            raise ValueError('priority must be one of {0}'.format(list(PRIORITY_DELAYS)))
+
+        queued_at = queued_at or int(time.time())
+
+        with self.batch():
+            self.priority = priority
+            self.queued_at = queued_at
+
+        self.db.zadd(TRANSACTION_PRIORITIES_KEY, queued_at + PRIORITY_DELAYS[priority], self.tnum)
+        status.transaction_queue.rpush(self.tnum)
+
+    def put_back_in_queue(self):
+        """ Puts a transaction that was taken off of the queue back in its place. """
+        self.add_to_queue(self.priority or 'interactive', self.queued_at)
+
+    def _save_wait_time(self):
+        priority = self.priority or 'interactive'
+        self.wait_seconds = max(0, int(time.time()) - (self.queued_at or int(time.time())))
+
+        pipe = self.db.pipeline()
+        pipe.hincrby(TRANSACTION_WAIT_STATS_KEY, '{0}:count'.format(priority), 1)
+        pipe.hincrby(TRANSACTION_WAIT_STATS_KEY, '{0}:seconds'.format(priority), self.wait_seconds)
+        pipe.execute()
+
+    def update_status(self, msg):
+        """ Sets this transaction's status (it's also shown as the server's latest status). """
+        self.current_status = msg
+        status.current_status = msg
+
     def start(self):
         if self._repo_queue is None:
             logger.debug('self._repo_queue is: %s', self._repo_queue)
             raise AttributeError('_repo_queue is required to start a transaction.')
 
-        status.current_status = 'Initializing build transaction.'
-        self.is_running = True
+        self.update_status('Initializing build transaction.')
+
+        with self.batch():
+            self.is_running = True
+            self.worker = '{0}.{1}'.format(socket.gethostname(), os.getpid())
 
         status.transactions_running.append(self.tnum)
+
+        try:
+            self._run()
+        finally:
+            with self.batch():
+                self.is_running = False
+                self.is_finished = True
+
+            status.transactions_running.remove(self.tnum)
+
+            if self.path:
+                remove(self.path)
+
+    def _run(self):
         self.setup_transaction_directory()
 
-        status.current_status = 'Processing packages.'
+        self.update_status('Processing packages.')
 
         self.process_packages()
 
         if self.sync_pkgbuilds_only:
             return
 
-        status.current_status = 'Cleaning pacman package cache.'
+        self.update_status('Cleaning pacman package cache.')
 
         if len(status.transactions_running) == 1:
             PacmanPackageCache().maybe_do_cache_cleanup()
 
-        while self.queue:
-            pkg = self.queue.lpop()
-            build_dir = self.get_build_directory(pkg)
+        for layer in self.get_build_layers():
+            self.build_layer(layer)
 
-            if not build_dir:
-                raise RuntimeError('build_dir cannot be None.')
+    def get_build_layers(self):
+        """
+        Splits the queue into layers of packages that don't depend on each other (using the
+        internal dependencies found by `process_packages`). Each layer only depends on the
+        layers before it.
 
-            pkg_obj = get_pkg_object(name=pkg)
-            bld_obj = get_build_object(pkg_obj=pkg_obj, tnum=self.tnum, trans_obj=self)
+        Returns:
+            list: The layers (lists of package names) in build order.
 
-            if pkg_obj.is_iso:
-                self.fetch_and_compile_translations(
-                    translations_for=["cnchi_updater", "antergos-gfxboot"]
-                )
-                result = bld_obj.start(pkg_obj)
-            else:
-                bld_obj = self.setup_build_directory(bld_obj, build_dir)
-                result = bld_obj.start(pkg_obj)
+        """
+
+        queued = list(self.queue)
+        layers = [
+            [pkg for pkg in layer if pkg in queued]
+            for layer in self.determine_build_layers(self._internal_deps)
+        ]
+        layered = set(itertools.chain.from_iterable(layers))
 
-            if result in [True, False]:
-                blds = pkg_obj.builds
-                total = len(blds)
+        layers.extend([pkg] for pkg in queued if pkg not in layered)
 
-                if total > 0:
-                    success = len([x for x in blds if x in status.completed])
-                    failure = len([x for x in blds if x in status.failed])
+        return [layer for layer in layers if layer]
 
-                    if success > 0:
-                        success = 100 * success / total
+    def _prepare_build(self, pkg):
+        build_dir = self.get_build_directory(pkg)
 
-                    if failure > 0:
-                        failure = 100 * failure / total
+        if not build_dir:
+            raise RuntimeError('build_dir cannot be None.')
 
-                    pkg_obj.success_rate = success
-                    pkg_obj.failure_rate = failure
+        pkg_obj = get_pkg_object(name=pkg)
+        bld_obj = get_build_object(pkg_obj=pkg_obj, tnum=self.tnum, trans_obj=self)
 
-                if result is True:
-                    if not pkg_obj.is_iso:
-                        gevent.sleep(2)
-                        self.move_files_to_staging_repo(bld_obj)
-                        repo_queue.enqueue_call(self._staging_repo.update_repo)
-                        repo_queue.enqueue_call(self._staging_repo32.update_repo)
-                        gevent.sleep(12)
+        if pkg_obj.is_iso:
+            self.fetch_and_compile_translations(
+                translations_for=["cnchi_updater", "antergos-gfxboot"]
+            )
+        else:
+            bld_obj = self.setup_build_directory(bld_obj, build_dir)
+
+        return pkg_obj, bld_obj
+
+    def _lock_packages(self, layer, stack):
+        # The locks are always taken in the same (sorted) order so that transactions which
+        # build some of the same packages can't deadlock.
+        locks = {}
+
+        for pkg in sorted(layer):
+            lock = FencedLock(self.db, 'package:{0}'.format(pkg))
+            lock.acquire(on_wait=lambda: self.update_status(
+                'Waiting for another transaction to finish building {0}.'.format(pkg)
+            ))
+            stack.callback(lock.release)
+            locks[pkg] = lock
+
+        return locks
+
+    def _save_build_result(self, pkg_obj, bld_obj, result, lock):
+        if result is True and not lock.fence():
+            # Our lock expired and the package was built by another transaction since.
+            logger.error('Discarding build %s of %s (superseded by a newer build).',
+                         bld_obj.bnum, pkg_obj.pkgname)
+            result = False
+
+        if result in [True, False]:
+            blds = pkg_obj.builds
+            total = len(blds)
+
+            if total > 0:
+                success = len([x for x in blds if x in status.completed])
+                failure = len([x for x in blds if x in status.failed])
 
-                    self.completed.append(bld_obj.bnum)
-                    doc_util.do_docker_clean(pkg_obj.name)
+                if success > 0:
+                    success = 100 * success / total
 
-                elif result is False:
-                    self.failed.append(bld_obj.bnum)
+                if failure > 0:
+                    failure = 100 * failure / total
 
-            status.now_building.remove(bld_obj.bnum)
+                pkg_obj.success_rate = success
+                pkg_obj.failure_rate = failure
 
-        self.is_running = False
-        self.is_finished = True
-        status.transactions_running.remove(self.tnum)
+            if result is True:
+                if not pkg_obj.is_iso:
+                    self.move_files_to_staging_repo(bld_obj)
 
-        remove(self.path)
+                self.completed.append(bld_obj.bnum)
+                doc_util.do_docker_clean(bld_obj.container)
+
+            elif result is False:
+                self.failed.append(bld_obj.bnum)
+
+        status.now_building.remove(bld_obj.bnum)
+
+    def build_layer(self, layer):
+        """
+        Builds a layer of packages (see `get_build_layers`) concurrently, running up to
+        `max_parallel_builds` builds at a time (ISO builds always run one at a time). Once all
+        of them are done, the packages that were built successfully are moved to the staging
+        repo in queue order and the staging repo is updated once for the whole layer.
+
+        A package is never built by two transactions at the same time: the layer's packages
+        are locked (see `FencedLock`) until their results have been saved.
+
+        Args:
+            layer (list): Names of the packages to build.
+
+        """
+
+        with contextlib.ExitStack() as stack:
+            locks = self._lock_packages(layer, stack)
+            self._build_locked_layer(layer, locks)
+
+    def _build_locked_layer(self, layer, locks):
+        builds = []
+
+        for pkg in layer:
+            self.queue.remove(pkg)
+            builds.append(self._prepare_build(pkg))
+
+        with Connection(self.db):
+            current_job = get_current_job()
+
+        if current_job is not None:
+            current_job.meta['building_nums'] = [bld_obj.bnum for _, bld_obj in builds]
+            current_job.save()
+
+        if any(pkg_obj.is_iso for pkg_obj, _ in builds):
+            max_workers = 1
+        else:
+            max_workers = min(self.max_parallel_builds, len(builds))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda build: build[1].start(build[0]), builds))
+
+        if any(result is True and not pkg_obj.is_iso
+               for (pkg_obj, _), result in zip(builds, results)):
+            gevent.sleep(2)
+
+        for (pkg_obj, bld_obj), pkg, result in zip(builds, layer, results):
+            self._save_build_result(pkg_obj, bld_obj, result, locks[pkg])
+
+        if any(bld_obj.staging_files for _, bld_obj in builds):
+            repo_queue.enqueue_call(self._staging_repo.update_repo)
+            repo_queue.enqueue_call(self._staging_repo32.update_repo)
+            gevent.sleep(12)
 
     def setup_transaction_directory(self):
         path = tempfile.mkdtemp(prefix='{0}_'.format(str(self.tnum)), dir=self.base_path)
@@ -294,8 +473,8 @@ class Transaction(TransactionMeta):
 
         if 'cnchi' in pkg:
             logger.info('cnchi package detected.')
-            status.current_status = 'Fetching latest translations for %s from Transifex.' % pkg
-            logger.info(status.current_status)
+            self.update_status('Fetching latest translations for %s from Transifex.' % pkg)
+            logger.info(self.current_status)
             self.fetch_and_compile_translations(translations_for=["cnchi"], pkg_obj=pkg_obj)
 
     @staticmethod
@@ -373,7 +552,7 @@ class Transaction(TransactionMeta):
 
             log_msg = 'Updating pkgver in database for {0} to {1}'.format(pkg, version)
             logger.info(log_msg)
-            status.current_status = log_msg
+            self.update_status(log_msg)
 
             depends = pkg_obj.get_deps()
 
@@ -386,7 +565,7 @@ class Transaction(TransactionMeta):
 
             self.handle_special_cases(pkg, pkg_obj)
 
-        status.current_status = 'Using package dependencies to determine build order.'
+        self.update_status('Using package dependencies to determine build order.')
         if self._internal_deps:
             for name in self.determine_build_order(self._internal_deps):
                 if name not in self.queue:
@@ -460,59 +639,69 @@ class Transaction(TransactionMeta):
                 logger.error(err)
 
     @staticmethod
-    def determine_build_order(source):
+    def determine_build_layers(source):
         """
-        Performs a topological sort on elements. This determines the order in which
-        packages must be built based on internal (to this transaction) dependencies.
+        Performs a topological sort on elements, grouped in layers. This determines the order
+        in which packages must be built based on internal (to this transaction) dependencies.
+        The packages in a layer don't depend on each other, only on packages in earlier layers.
 
         Args:
             source (list): A list of ``(name, [list of dependancies])`` pairs.
 
         Returns:
-            A list of names, with dependancies listed first.
-
-        Raises:
-            ValueError: When cyclic or missing dependancy detected.
+            A list of layers (lists of names), with dependancies listed first. When a cyclic or
+            missing dependancy is detected, the remaining names get one layer each.
 
         """
         # copy deps so we can modify set in-place
         pending = [(name, set(deps)) for name, deps in source]
         emitted = []
-        try:
-            while pending:
-                next_pending = []
-                next_emitted = []
-
-                for entry in pending:
-                    name, deps = entry
-                    # remove deps we emitted last pass
-                    deps.difference_update(emitted)
-
-                    if deps:
-                        # still has deps? recheck during next pass
-                        next_pending.append(entry)
-                    else:
-                        # no more deps? time to emit
-                        yield name
-                        emitted.append(name)
-                        # remember what we emitted for difference_update() in next pass
-                        next_emitted.append(name)
-
-                if not next_emitted:
-                    # all entries have unmet deps, one of two things is wrong...
-                    logger.error('cyclic or missing dependancy detected: %r', next_pending)
-                    names = [n for n, d in source]
-                    deps = [d for n, d in source]
-                    missing = [m for d in deps for m in d if m not in names]
-                    logger.error(names)
-                    logger.error(deps)
-                    logger.error(missing)
-
-                    raise ValueError
-                pending = next_pending
-                emitted = next_emitted
-        except ValueError as err:
-            logger.error(err)
+        layers = []
+
+        while pending:
+            next_pending = []
+            next_emitted = []
+
+            for entry in pending:
+                name, deps = entry
+                # remove deps we emitted last pass
+                deps.difference_update(emitted)
+
+                if deps:
+                    # still has deps? recheck during next pass
+                    next_pending.append(entry)
+                else:
+                    # no more deps? time to emit (remember what we emitted for
+                    # difference_update() in next pass)
+                    next_emitted.append(name)
+
+            if not next_emitted:
+                # all entries have unmet deps, one of two things is wrong...
+                logger.error('cyclic or missing dependancy detected: %r', next_pending)
+                names = [n for n, d in source]
+                deps = [d for n, d in source]
+                missing = [m for d in deps for m in d if m not in names]
+                logger.error(names)
+                logger.error(deps)
+                logger.error(missing)
+
+                layers.extend([name] for name, _ in next_pending)
+                break
+
+            layers.append(next_emitted)
+            pending = next_pending
+            emitted = next_emitted
+
+        return layers
+
+    @staticmethod
+    def determine_build_order(source):
+        """
+        Returns a list of names, with dependancies listed first (see `determine_build_layers`).
+
+        """
+
+        return list(itertools.chain.from_iterable(Transaction.determine_build_layers(source)))
 
 
 def get_trans_object(packages=None, tnum=None, repo_queue=None):
@@ -535,6 +724,177 @@ def get_trans_object(packages=None, tnum=None, repo_queue=None):
     elif all([packages, tnum]):
         raise ValueError('Only one of [packages, tnum] can be given, not both.')
 
-    trans_obj = Transaction(packages=packages, tnum=tnum, repo_queue=repo_queue)
+    if tnum:
+        return get_or_create('trans', tnum, lambda: Transaction(tnum=tnum, repo_queue=repo_queue))
+
+    trans_obj = Transaction(packages=packages, repo_queue=repo_queue)
+
+    return register('trans', trans_obj.tnum, trans_obj)
+
+
+def claim_next_transaction():
+    """
+    Takes the next transaction (the one with the lowest score in `TRANSACTION_PRIORITIES_KEY`)
+    off of the queue. Any number of workers can do this at the same time. The queue's lock is
+    held while claiming so that a transaction can't be started while `queue_transaction` is
+    merging packages into it.
+
+    Returns:
+        Transaction: The transaction, `None` when the queue is empty.
+
+    """
+
+    db = status.db
+
+    with FencedLock(db, 'transaction_queue', ttl=30):
+        return _claim_next_transaction(db)
+
+
+def _claim_next_transaction(db):
+    while True:
+        tnums = db.zrange(TRANSACTION_PRIORITIES_KEY, 0, 9)
+
+        if not tnums:
+            # Transactions that were queued before they had a priority class.
+            tnum = status.transaction_queue.lpop()
+
+            if not tnum:
+                return None
+
+            trans_obj = get_trans_object(tnum=int(tnum), repo_queue=repo_queue)
+
+            if trans_obj.priority and not db.zrem(TRANSACTION_PRIORITIES_KEY, tnum):
+                # It was just queued and another worker has already taken it.
+                continue
+
+            return trans_obj
+
+        for tnum in tnums:
+            # Only one of the workers that try to remove a transaction will succeed.
+            if db.zrem(TRANSACTION_PRIORITIES_KEY, tnum):
+                status.transaction_queue.remove(tnum)
+                trans_obj = get_trans_object(tnum=int(tnum), repo_queue=repo_queue)
+                trans_obj._save_wait_time()
+
+                return trans_obj
+
+
+def _merge_into_queued_transactions(packages, priority, gh_sha_after, sync_pkgbuilds_only):
+    db = status.db
+    merged = OrderedDict()
+
+    for tnum in db.zrange(TRANSACTION_PRIORITIES_KEY, 0, -1):
+        trans_obj = get_trans_object(tnum=int(tnum), repo_queue=repo_queue)
+        dups = [p for p in packages if p not in merged and p in trans_obj.packages]
+
+        if not dups or trans_obj.sync_pkgbuilds_only != bool(sync_pkgbuilds_only):
+            continue
+
+        if db.zscore(TRANSACTION_PRIORITIES_KEY, tnum) is None:
+            # It was started in the meantime.
+            continue
+
+        upgrade = PRIORITY_DELAYS[priority] < PRIORITY_DELAYS.get(trans_obj.priority, 0)
+
+        with trans_obj.batch():
+            trans_obj.coalesced += len(dups)
+
+            if gh_sha_after:
+                trans_obj.gh_sha_after = gh_sha_after
+
+            if upgrade:
+                trans_obj.priority = priority
+
+        if upgrade:
+            score = trans_obj.queued_at + PRIORITY_DELAYS[priority]
+            db.execute_command('ZADD', TRANSACTION_PRIORITIES_KEY, 'XX', score, tnum)
+
+        merged.update((p, trans_obj.tnum) for p in dups)
+
+    return merged
+
+
+def queue_transaction(packages, priority='interactive', repo_queue=None, update_merged_shas=True,
+                      **fields):
+    """
+    Queues a build transaction for packages (see `Transaction.add_to_queue`). Packages that
+    are already waiting in a queued transaction are merged into that transaction instead
+    (it will build the newest commit, so its `gh_sha_after` is updated and it is moved up to
+    this request's priority class when that's higher). A package that is building gets at
+    most one follow-up build this way: later requests are merged into the first one.
+
+    Args:
+        packages (list): Names of the packages to build.
+        priority (str): The priority class (one of `PRIORITY_DELAYS`).
+        repo_queue (rq.Queue): See `get_trans_object`.
+        update_merged_shas (bool): Whether `gh_sha_after` replaces that of the transactions
+                                   that packages are merged into (`False` when it is not the
+                                   newest commit, eg. when a transaction is rerun).
+        **fields: Values for the new transaction's attributes (eg. `initiated_by`). They are
+                  saved before the transaction is added to the queue.
+
+    Returns:
+        tuple: The new `Transaction` (`None` when all of the packages were merged into queued
+               transactions) and an `OrderedDict` that maps the names of the packages that
+               were merged to the `tnum` of the transaction they were merged into.
+
+    """
+
+    with FencedLock(status.db, 'transaction_queue', ttl=30):
+        merged = _merge_into_queued_transactions(
+            packages,
+            priority,
+            fields.get('gh_sha_after') if update_merged_shas else None,
+            fields.get('sync_pkgbuilds_only')
+        )
+        remaining = [p for p in packages if p not in merged]
+
+        if not remaining:
+            return None, merged
+
+        trans_obj = get_trans_object(packages=remaining, repo_queue=repo_queue)
+
+        with trans_obj.batch():
+            for name, value in fields.items():
+                setattr(trans_obj, name, value)
+
+        trans_obj.add_to_queue(priority)
+
+    if merged:
+        logger.info('Merged %s into queued transactions.', merged)
+
+    return trans_obj, merged
+
+
+def clear_transaction_queue():
+    """ Removes all of the transactions from the queue. Returns their numbers. """
+    pipe = status.db.pipeline()
+    pipe.lrange(status.transaction_queue.full_key, 0, -1)
+    pipe.delete(status.transaction_queue.full_key, TRANSACTION_PRIORITIES_KEY)
+
+    return pipe.execute()[0]
+
+
+def get_transaction_wait_stats():
+    """
+    Gets the number of transactions that were started, their average wait time (in seconds)
+    and the number of transactions waiting in the queue for each priority class.
+
+    """
+
+    stats = status.db.hgetall(TRANSACTION_WAIT_STATS_KEY)
+    waiting = [get_trans_object(tnum=int(tnum)) for tnum in status.transaction_queue if tnum]
+    result = OrderedDict()
+
+    for priority in PRIORITY_DELAYS:
+        count = int(stats.get('{0}:count'.format(priority), 0))
+        seconds = int(stats.get('{0}:seconds'.format(priority), 0))
+
+        result[priority] = dict(
+            started=count,
+            avg_wait_seconds=round(seconds / count, 1) if count else 0,
+            waiting=len([t for t in waiting if (t.priority or 'interactive') == priority])
+        )
+
+    return result
 
-    return trans_obj
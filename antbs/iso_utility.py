@@ -43,7 +43,8 @@ from utils import batch_sign
 from database import (
     get_pkg_object,
     db,
-    status
+    status,
+    job_identity_map
 )
 
 logger = status.logger
@@ -233,6 +234,7 @@ def clean_up_after_release(version):
                 os.remove(f)
 
 
+@job_identity_map
 def iso_release_job():
     saved_status = False
     if not status.idle and 'Idle' not in status.current_status:
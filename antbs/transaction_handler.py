@@ -37,14 +37,17 @@ from rq import (
 )
 
 from database import (
+    get_pkg_objects,
     get_repo_object,
     db,
     status,
-    get_trans_object
+    claim_next_transaction,
+    job_identity_map
 )
 
 from utils import (
     DockerUtils,
+    FencedLock,
     set_server_status
 )
 
@@ -59,25 +62,34 @@ with Connection(db):
     w2 = Worker([repo_queue])
 
 
+@job_identity_map
 def handle_hook():
     saved_status = set_server_status(first=True)
 
+    # Each job runs the next transaction in the queue (by priority, see
+    # `claim_next_transaction`), not necessarily the one it was enqueued for.
+    transaction = claim_next_transaction()
+    packages = transaction.packages if transaction is not None else []
+    is_iso = any(pkg_obj.is_iso for pkg_obj in get_pkg_objects(packages, fields=['is_iso']))
+
     logger.debug('calling maybe build docker image')
 
-    if not status.iso_flag:
-        image = doc_utils.maybe_build_base_devel()
-    else:
-        status.iso_flag = False
-        image = doc_utils.maybe_build_mkarchiso()
+    # Workers share the docker images, only one of them should (re)build them.
+    with FencedLock(db, 'docker_images', ttl=300):
+        if not is_iso:
+            image = doc_utils.maybe_build_base_devel()
+        else:
+            status.iso_flag = False
+            image = doc_utils.maybe_build_mkarchiso()
 
     if not image:
+        if transaction is not None:
+            transaction.put_back_in_queue()
+
         set_server_status(first=False, saved_status=saved_status)
         return False
 
-    if status.transaction_queue:
-        tnum = status.transaction_queue.lpop()
-        transaction = get_trans_object(tnum=tnum, repo_queue=repo_queue)
-
+    if transaction is not None:
         # Store this transaction's number and packages on the RQ job object.
         # We do this so that our custom exception handler can access the data
         # if an exception is raised while running this transaction.
@@ -92,14 +104,11 @@ def handle_hook():
 
     if not status.transaction_queue and not status.transactions_running:
         status.idle = True
-        status.building = 'Idle'
-        status.container = ''
-        status.building_num = ''
-        status.building_start = ''
         status.iso_building = False
         logger.info('All builds completed.')
 
 
+@job_identity_map
 def update_repo_databases():
     with Connection(db):
         current_job = get_current_job()
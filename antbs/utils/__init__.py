@@ -30,6 +30,10 @@ from .utility_functions import (
     quiet_down_noisy_loggers,
     all_file_paths_exist,
     get_build_queue,
+    get_live_output_key,
+    add_live_output,
+    get_live_output_stats,
+    LIVE_OUTPUT_MAX_LINES,
     recursive_chown,
     set_server_status,
     get_current_user,
@@ -41,11 +45,23 @@ from .utility_classes import (
     DateTimeStrings,
     PacmanPackageCache,
     CustomSet,
+    LRUCache,
+    LiveOutputPublisher,
     RQWorkerCustomExceptionHandler,
-    MyLock
+    MyLock,
+    FencedLock
+)
+
+from .log_pipeline import (
+    decode_lines,
+    strip_ansi,
+    dedupe,
+    add_timestamps,
+    fan_out
 )
 
 from .docker_util import DockerUtils
+from .resource_allocator import ResourceAllocator
 from .sign_pkgs import sign_packages, batch_sign
 from .pkgbuild import Pkgbuild
 from .pagination import Pagination
@@ -88,13 +88,16 @@ class DockerUtils(metaclass=Singleton):
             return host_configs[config_for](*args, **kwargs)
 
     def create_pkgs_host_config(self, pkgbuild_dir, result_dir=None, cache_dir_x86_64=None,
-                                cache_dir_i686=None, _32build=None, _32bit=None):
+                                cache_dir_i686=None, _32build=None, _32bit=None,
+                                cpuset_cpus='0-2', mem_limit='5G'):
         """
 
         :param cache_i686:
         :param cache:
         :param pkgbuild_dir:
         :param result_dir:
+        :param cpuset_cpus: The cores the container may use (eg. `0,1,2`).
+        :param mem_limit: The container's memory limit (eg. `4096M`).
         :return:
         """
         required_args = [result_dir, _32build, _32bit, pkgbuild_dir]
@@ -148,10 +151,40 @@ class DockerUtils(metaclass=Singleton):
         binds[result_dir] = {'bind': '/result', 'ro': False}
 
         pkgs_hconfig = self.doc.create_host_config(
-            binds=binds, privileged=True, mem_limit='5G', memswap_limit='-1', cpuset_cpus='0-2'
+            binds=binds, privileged=True, mem_limit=mem_limit, memswap_limit='-1',
+            cpuset_cpus=cpuset_cpus
         )
         return pkgs_hconfig
 
+    def get_container_usage(self, container):
+        """
+        Follows a container's resource usage stats until it exits (blocks until then).
+
+        :param container: The container's ID.
+        :return: dict: The container's total cpu time (`cpu_seconds`) and peak memory
+                 usage (`max_mem_mb`).
+        """
+        usage = dict(cpu_seconds=0, max_mem_mb=0)
+
+        try:
+            for stats in self.doc.stats(container, decode=True):
+                memory = stats.get('memory_stats') or {}
+
+                if not memory and usage['cpu_seconds']:
+                    # The container has exited.
+                    break
+
+                cpu = stats.get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage', 0)
+                mem = memory.get('max_usage') or memory.get('usage') or 0
+
+                usage['cpu_seconds'] = max(usage['cpu_seconds'], cpu // 10 ** 9)
+                usage['max_mem_mb'] = max(usage['max_mem_mb'], mem // 1024 ** 2)
+
+        except Exception as err:
+            self._logger.error(err)
+
+        return usage
+
     def create_repo_update_host_config(self, result_dir='/tmp/result'):
         """
 
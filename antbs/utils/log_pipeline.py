@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  log_pipeline.py
+#
+#  Copyright © 2016-2017 Antergos
+#
+#  This file is part of Antergos Build Server, (AntBS).
+#
+#  AntBS is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  AntBS is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  The following additional terms are in effect as per Section 7 of the license:
+#
+#  The preservation of all legal notices and author attributions in
+#  the material or in the Appropriate Legal Notices displayed
+#  by works containing it is required.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Composable generator stages for processing container logs. Each stage takes an iterable and
+returns a generator, so the stages can be chained and only hold a bounded amount of data, no
+matter how long the log is:
+
+    lines = decode_lines(doc.logs(container=container, stream=True, follow=True))
+    lines = add_timestamps(dedupe(strip_ansi(lines)))
+    fan_out(lines, publisher.add, log_writer.add)
+
+Any iterable of `bytes` can stand in for the container's log stream (eg. in tests).
+
+"""
+
+import codecs
+import re
+from datetime import datetime
+
+from .utility_classes import LRUCache
+
+ANSI_ESCAPE_RE = re.compile(r'\x1b(\[[0-?]*[ -/]*[@-~]|[@-Z\\-_])')
+
+
+def _split_long_line(line, max_line_length):
+    if not line:
+        yield line
+        return
+
+    for start in range(0, len(line), max_line_length):
+        yield line[start:start + max_line_length]
+
+
+def decode_lines(chunks, max_line_length=65536):
+    """
+    Splits a stream of `bytes` chunks (which don't have to line up with lines or with UTF-8
+    characters) into lines of text. Lines longer than `max_line_length` are split.
+
+    """
+
+    decoder = codecs.getincrementaldecoder('UTF-8')(errors='replace')
+    partial = ''
+
+    for chunk in chunks:
+        partial += decoder.decode(chunk)
+        *lines, partial = partial.split('\n')
+
+        for line in lines:
+            yield from _split_long_line(line, max_line_length)
+
+        while len(partial) > max_line_length:
+            yield partial[:max_line_length]
+            partial = partial[max_line_length:]
+
+    partial += decoder.decode(b'', final=True)
+
+    if partial:
+        yield from _split_long_line(partial, max_line_length)
+
+
+def strip_ansi(lines):
+    """ Removes ANSI escape sequences (colors, cursor movements, etc) and trailing whitespace. """
+    for line in lines:
+        yield ANSI_ESCAPE_RE.sub('', line).rstrip()
+
+
+def dedupe(lines, window=10000, key=None):
+    """
+    Drops lines that were already seen among the last `window` distinct lines.
+
+    Args:
+        key (callable): Lines are compared by `key(line)` (default: the whole line).
+
+    """
+
+    seen = LRUCache(maxsize=window)
+
+    for line in lines:
+        line_hash = hash(key(line) if key else line)
+
+        if seen.get(line_hash) is None:
+            seen[line_hash] = True
+            yield line
+
+
+def add_timestamps(lines, fmt='%m/%d/%Y %I:%M%p', clock=datetime.now):
+    """
+    Prefixes lines with the current time (as returned by `clock()`). `fmt` should not include
+    seconds: the timestamp is only formatted once per minute.
+
+    """
+
+    minute = stamp = None
+
+    for line in lines:
+        now = clock()
+
+        if minute != now.replace(second=0, microsecond=0):
+            minute = now.replace(second=0, microsecond=0)
+            stamp = now.strftime(fmt)
+
+        yield '[{0}]: {1}'.format(stamp, line)
+
+
+def fan_out(lines, *sinks):
+    """ Consumes `lines`, passing each one to every sink (a callable). Returns the line count. """
+    count = 0
+
+    for line in lines:
+        for sink in sinks:
+            sink(line)
+
+        count += 1
+
+    return count
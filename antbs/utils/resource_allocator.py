@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  resource_allocator.py
+#
+#  Copyright © 2016-2017 Antergos
+#
+#  This file is part of Antergos Build Server, (AntBS).
+#
+#  AntBS is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  AntBS is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  The following additional terms are in effect as per Section 7 of the license:
+#
+#  The preservation of all legal notices and author attributions in
+#  the material or in the Appropriate Legal Notices displayed
+#  by works containing it is required.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with AntBS; If not, see <http://www.gnu.org/licenses/>.
+
+""" Allocation of host resources (cpu cores and memory) to build containers. """
+
+import json
+import os
+import time
+from collections import namedtuple
+
+
+class Allocation(namedtuple('Allocation', ['cpus', 'mem_mb'])):
+    """ Resources allocated to a build: cores (`list` of `str`) and memory (in MB). """
+
+    @property
+    def cpuset(self):
+        # The format docker expects (eg. `0,1,2`).
+        return ','.join(self.cpus)
+
+# KEYS[1] is a hash of allocations (bnum -> json). ARGV: bnum, cpus, mem_mb, now, expires,
+# total_mem_mb followed by the ids of all the cores that can be allocated. Expired allocations
+# (eg. of a worker that crashed) are dropped. Returns the allocated cores (nil when there
+# aren't enough free resources).
+_ALLOCATE_SCRIPT = """
+local bnum, ncpus, mem, now = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local used_cpus, used_mem = {}, 0
+local allocations = redis.call('HGETALL', KEYS[1])
+
+for i = 1, #allocations, 2 do
+    local allocation = cjson.decode(allocations[i + 1])
+
+    if allocation.expires < now then
+        redis.call('HDEL', KEYS[1], allocations[i])
+    elseif allocations[i] ~= bnum then
+        for _, cpu in ipairs(allocation.cpus) do
+            used_cpus[cpu] = true
+        end
+        used_mem = used_mem + allocation.mem_mb
+    end
+end
+
+local cpus = {}
+
+for i = 7, #ARGV do
+    if #cpus < ncpus and not used_cpus[ARGV[i]] then
+        table.insert(cpus, ARGV[i])
+    end
+end
+
+if #cpus < ncpus or tonumber(ARGV[6]) - used_mem < mem then
+    return nil
+end
+
+redis.call('HSET', KEYS[1], bnum, cjson.encode({
+    cpus = cpus, mem_mb = mem, allocated = now, expires = tonumber(ARGV[5])
+}))
+
+return cpus
+"""
+
+
+def _parse_cpuset(cpuset):
+    cpus = []
+
+    for part in cpuset.split(','):
+        first, _, last = part.partition('-')
+        cpus.extend(str(cpu) for cpu in range(int(first), int(last or first) + 1))
+
+    return cpus
+
+
+def _get_total_memory_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 1024 ** 2
+    except (ValueError, OSError):
+        return 8192
+
+
+class ResourceAllocator:
+    """
+    Hands out disjoint sets of cpu cores (and a share of the memory) to build containers. The
+    allocations are kept in redis so that they are shared by all workers on the host. When
+    there aren't enough free resources, `allocate()` waits until another build releases its
+    allocation.
+
+    Args:
+        redis_client (redis.StrictRedis): The redis client to use.
+        cpuset (str): The cores that can be allocated, eg. `0-5,8` (default:
+                      ANTBS_BUILD_CPUSET or all of the host's cores).
+        mem_mb (int): Memory (in MB) that can be allocated (default: ANTBS_BUILD_MEMORY_MB or
+                      three quarters of the host's memory).
+        max_build_seconds (int): Allocations expire after this long, in case a worker dies
+                                 before releasing its allocation.
+
+    """
+
+    allocations_key = 'antbs:misc:resources:allocations'
+    released_key = 'antbs:misc:resources:released'
+
+    def __init__(self, redis_client, cpuset=None, mem_mb=None, max_build_seconds=4 * 3600):
+        if cpuset is None:
+            cpuset = os.environ.get('ANTBS_BUILD_CPUSET', '0-{0}'.format((os.cpu_count() or 1) - 1))
+
+        if mem_mb is None:
+            mem_mb = int(os.environ.get('ANTBS_BUILD_MEMORY_MB', _get_total_memory_mb() * 3 // 4))
+
+        self.db = redis_client
+        self.cpus = _parse_cpuset(cpuset)
+        self.mem_mb = mem_mb
+        self.max_build_seconds = max_build_seconds
+        self._allocate = redis_client.register_script(_ALLOCATE_SCRIPT)
+
+    def allocate(self, bnum, cpus, mem_mb, on_wait=None):
+        """
+        Allocates resources to a build, waiting for them to be available when necessary.
+        Requests larger than the allocator's resources are reduced to fit.
+
+        Args:
+            bnum (int): The build's number.
+            cpus (int): Number of cores.
+            mem_mb (int): Memory in MB.
+            on_wait (callable): Called (once) when the build has to wait for resources.
+
+        Returns:
+            Allocation: The allocated cores (`list` of `str`) and memory.
+
+        """
+
+        cpus = max(1, min(cpus, len(self.cpus)))
+        mem_mb = max(1, min(mem_mb, self.mem_mb))
+        waiting = False
+
+        while True:
+            now = int(time.time())
+            allocated = self._allocate(
+                keys=[self.allocations_key],
+                args=[bnum, cpus, mem_mb, now, now + self.max_build_seconds, self.mem_mb] + self.cpus
+            )
+
+            if allocated:
+                return Allocation(cpus=list(allocated), mem_mb=mem_mb)
+
+            if not waiting and on_wait is not None:
+                on_wait()
+
+            waiting = True
+            self.db.blpop(self.released_key, timeout=5)
+
+    def release(self, bnum):
+        """ Releases a build's resources and wakes up a build that is waiting for resources. """
+        pipe = self.db.pipeline()
+        pipe.hdel(self.allocations_key, bnum)
+        pipe.lpush(self.released_key, bnum)
+        pipe.ltrim(self.released_key, 0, 9)
+        pipe.execute()
+
+    def get_allocations(self):
+        """ Returns the current allocations (`dict` of bnum -> allocation `dict`). """
+        return {
+            bnum: json.loads(allocation)
+            for bnum, allocation in self.db.hgetall(self.allocations_key).items()
+        }
@@ -35,7 +35,7 @@ import os
 import subprocess
 import logging
 
-from . import remove
+from . import remove, add_live_output
 
 logger = logging.getLogger('antbs')
 GPG_BIN = '/usr/bin/gpg'
@@ -50,10 +50,7 @@ def batch_sign(paths, db, bnum='', uid='', passphrase='', is_iso=False):
 
     for path in paths:
         logger.info('[SIGN PKG] Creating detached signature for %s' % path)
-        db.publish(
-            'live:build_output:{0}'.format(bnum),
-            'Creating detached signature for %s' % path
-        )
+        add_live_output(db, bnum, 'Creating detached signature for %s' % path)
 
         sigpath = path + SIG_EXT
 
@@ -77,14 +74,12 @@ def batch_sign(paths, db, bnum='', uid='', passphrase='', is_iso=False):
 
         if len(out) > 0:
             logger.info('GPG OUTPUT is: {0}'.format(out.decode('UTF-8')))
-            db.publish(
-                'live:build_output:{0}'.format(bnum),
-                'GPG OUTPUT is: {0}'.format(out.decode('UTF-8'))
-            )
+            add_live_output(db, bnum, 'GPG OUTPUT is: {0}'.format(out.decode('UTF-8')))
 
         if len(err) > 0:
-            db.publish(
-                'live:build_output:{0}'.format(bnum),
+            add_live_output(
+                db,
+                bnum,
                 'Signing FAILED for {0}. Error output: {1}'.format(path, err.decode('UTF-8'))
             )
             logger.error(
@@ -107,7 +102,7 @@ def batch_sign(paths, db, bnum='', uid='', passphrase='', is_iso=False):
 
 def sign_packages(generated_pkgs, db, bnum='', uid='', gpg_pass=''):
 
-    db.publish('live:build_output:{0}'.format(bnum), 'Signing packages..')
+    add_live_output(db, bnum, 'Signing packages..')
 
     logger.info('[PKGS TO SIGN] %s' % generated_pkgs)
 
@@ -31,11 +31,13 @@
 import glob
 import logging
 import os
+import threading
+from collections import OrderedDict
 
 import gevent
-from redis.exceptions import LockError
+from redis.exceptions import LockError, RedisError
 
-from . import remove
+from . import remove, add_live_output
 
 
 class Singleton(type):
@@ -121,6 +123,148 @@ class CustomSet(set):
         return added
 
 
+class LRUCache:
+    """
+    A dict-like cache that holds at most `maxsize` items, evicting the least recently used
+    item when it is full. Keeps hit/miss/eviction counters (see `LRUCache.stats()`). It is
+    safe to share between threads (eg. the builds of a transaction's layer).
+
+    Args:
+        maxsize (int): The maximum number of items in the cache.
+
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get(self, key, default=None):
+        """ Returns the item for `key` (marking it as recently used) or `default`. """
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._items.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            size=len(self),
+            maxsize=self.maxsize
+        )
+
+
+class LiveOutputPublisher:
+    """
+    Publishes a build's live output in micro-batches. Lines are queued and flushed to the
+    build's live output stream (one pipelined request, see `add_live_output`) once
+    `max_lines` lines are queued or `flush_interval` milliseconds after the last flush,
+    whichever comes first. Use it as a context manager so that a background thread takes care
+    of the timed flushes and the remaining lines are flushed at the end.
+
+    Args:
+        db (redis.StrictRedis): The redis client to use.
+        bnum (int|str): The build's number.
+        flush_interval (int): Milliseconds between timed flushes
+                              (default: ANTBS_LIVE_OUTPUT_FLUSH_INTERVAL or 250).
+        max_lines (int): Flush as soon as this many lines are queued
+                         (default: ANTBS_LIVE_OUTPUT_FLUSH_LINES or 500).
+
+    """
+
+    def __init__(self, db, bnum, flush_interval=None, max_lines=None):
+        if flush_interval is None:
+            flush_interval = int(os.environ.get('ANTBS_LIVE_OUTPUT_FLUSH_INTERVAL', 250))
+
+        if max_lines is None:
+            max_lines = int(os.environ.get('ANTBS_LIVE_OUTPUT_FLUSH_LINES', 500))
+
+        self.db = db
+        self.bnum = bnum
+        self.flush_interval = flush_interval
+        self.max_lines = max_lines
+        self.lines = self.batches = self.bytes = 0
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = None
+
+    def __enter__(self):
+        self._stopped.clear()
+        self._flusher = threading.Thread(target=self._run, daemon=True)
+        self._flusher.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._flusher.join()
+        self.flush()
+
+    def _flush(self):
+        lines, self._pending = self._pending, []
+
+        if not lines:
+            return
+
+        add_live_output(self.db, self.bnum, *lines, lines_per_entry=self.max_lines)
+
+        self.lines += len(lines)
+        self.batches += 1
+        self.bytes += len('\n'.join(lines).encode('UTF-8'))
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval / 1000):
+            try:
+                self.flush()
+            except Exception as err:
+                logging.exception(err)
+
+    def add(self, line):
+        with self._lock:
+            self._pending.append(line)
+
+            if len(self._pending) >= self.max_lines:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def stats(self):
+        return dict(lines=self.lines, batches=self.batches, bytes=self.bytes)
+
+
 class RQWorkerCustomExceptionHandler:
     status = None
     logger = None
@@ -134,18 +278,18 @@ class RQWorkerCustomExceptionHandler:
     def handle_worker_exception(self, job, exc_type, exc_value, traceback):
         tnum = job.meta.get('tnum', 0)
         packages = job.meta.get('packages', [])
-        bnum = job.meta.get('building_num', 0)
+        bnums = job.meta.get('building_nums') or [job.meta.get('building_num', 0)]
 
         running = self.status.transactions_running and tnum in self.status.transactions_running
-        building = self.status.now_building and bnum in self.status.now_building
 
         self.logger.exception('%s | %s | %s | %s', job, exc_type, exc_value, traceback)
 
         if running:
             self.status.transactions_running.remove(tnum)
 
-        if building:
-            self.status.now_building.remove(bnum)
+        for bnum in bnums:
+            if self.status.now_building and bnum in self.status.now_building:
+                self.status.now_building.remove(bnum)
 
         if not self.status.transactions_running and not self.status.now_building:
             self.status.idle = True
@@ -169,3 +313,171 @@ class MyLock:
             self.lock.release()
 
 
+# KEYS: the lock's key and its token counter. ARGV: the lock's ttl (ms). Returns the new
+# fencing token (nil when the lock is held).
+_LOCK_ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return nil
+end
+
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token, 'PX', ARGV[1])
+
+return token
+"""
+
+# KEYS: the lock's key. ARGV: token, ttl (ms).
+_LOCK_EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+
+return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+"""
+
+# KEYS: the lock's key and the list that wakes up waiters. ARGV: token.
+_LOCK_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+
+redis.call('DEL', KEYS[1])
+redis.call('LPUSH', KEYS[2], ARGV[1])
+redis.call('LTRIM', KEYS[2], 0, 9)
+redis.call('EXPIRE', KEYS[2], 60)
+
+return 1
+"""
+
+# KEYS: the hash of the newest token used for each lock, the lock's token counter. ARGV: lock
+# name, token. Returns 0 when a newer token has already been issued or used.
+_LOCK_FENCE_SCRIPT = """
+local newest = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local issued = tonumber(redis.call('GET', KEYS[2]) or '0')
+
+if tonumber(ARGV[2]) < newest or tonumber(ARGV[2]) < issued then
+    return 0
+end
+
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+
+return 1
+"""
+
+
+class FencedLock:
+    """
+    A lock that is shared by all processes (it's kept in redis). Each time the lock is
+    acquired it hands out a fencing token that is larger than any token handed out before.
+
+    The lock expires `ttl` seconds after it was last renewed (it's renewed in a thread while
+    it is held), so the lock of a worker that died is eventually released. A holder can't
+    know that its lock expired (eg. while its process was stalled), so changes to the shared
+    resource should only be made after `fence()` confirms that no newer token was used.
+
+    Args:
+        redis_client (redis.StrictRedis): The redis client to use.
+        name (str): The lock's name (eg. `package:cnchi`).
+        ttl (int): Seconds after which the lock expires unless it is renewed.
+
+    """
+
+    key_prefix = 'antbs:misc:locks:'
+    fences_key = 'antbs:misc:locks:fences'
+
+    def __init__(self, redis_client, name, ttl=60):
+        self.db = redis_client
+        self.name = name
+        self.key = self.key_prefix + name
+        self.token_key = self.key + ':token'
+        self.ttl = ttl
+        self.token = None
+        self.lost = False
+
+        self._stop_renewing = threading.Event()
+        self._renewer = None
+        self._acquire = redis_client.register_script(_LOCK_ACQUIRE_SCRIPT)
+        self._extend = redis_client.register_script(_LOCK_EXTEND_SCRIPT)
+        self._release = redis_client.register_script(_LOCK_RELEASE_SCRIPT)
+        self._fence = redis_client.register_script(_LOCK_FENCE_SCRIPT)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def _renew(self):
+        while not self._stop_renewing.wait(self.ttl / 3):
+            try:
+                extended = self._extend(keys=[self.key], args=[self.token, self.ttl * 1000])
+            except RedisError as err:
+                logging.error('Unable to renew lock %s: %s', self.name, err)
+                continue
+
+            if not extended:
+                logging.error('Lock %s expired before it was renewed.', self.name)
+                self.lost = True
+                return
+
+    def acquire(self, on_wait=None):
+        """
+        Acquires the lock, waiting for it to be released when it is held.
+
+        Args:
+            on_wait (callable): Called (once) when the lock is held by someone else.
+
+        Returns:
+            int: The fencing token.
+
+        """
+
+        waiting = False
+
+        while self.token is None:
+            token = self._acquire(keys=[self.key, self.token_key], args=[self.ttl * 1000])
+
+            if token is not None:
+                self.token = int(token)
+                break
+
+            if not waiting and on_wait is not None:
+                on_wait()
+
+            waiting = True
+            self.db.blpop(self.key + ':released', timeout=5)
+
+        self.lost = False
+        self._stop_renewing.clear()
+        self._renewer = threading.Thread(target=self._renew, daemon=True)
+        self._renewer.start()
+
+        return self.token
+
+    def release(self):
+        """ Releases the lock (if it is held) and wakes up a process that is waiting for it. """
+        if self.token is None:
+            return
+
+        self._stop_renewing.set()
+        self._renewer.join()
+        self._release(keys=[self.key, self.key + ':released'], args=[self.token])
+        self.token = None
+
+    def fence(self):
+        """
+        Checks that changes can still be made with this lock's token, ie. no newer token has
+        been issued or used since (which only happens after this lock expired).
+
+        Returns:
+            bool: `True` if changes can be made.
+
+        """
+
+        if self.token is None:
+            return False
+
+        return bool(self._fence(
+            keys=[self.fences_key, self.token_key], args=[self.name, self.token]
+        ))
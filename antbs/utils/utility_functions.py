@@ -213,6 +213,55 @@ def get_build_queue(status_obj, get_transaction):
     return queued
 
 
+# Live build output is kept in a capped redis stream for each build (see `add_live_output`).
+# The cap is in lines: clients that (re)connect are sent at most this many lines of backlog.
+LIVE_OUTPUT_MAX_LINES = int(os.environ.get('ANTBS_LIVE_OUTPUT_MAX_LINES', 10000))
+LIVE_OUTPUT_TTL = 86400
+LIVE_OUTPUT_STATS_KEY = 'antbs:misc:live_output_stats'
+
+
+def get_live_output_key(bnum):
+    return 'live:build_output:{0}'.format(bnum)
+
+
+def add_live_output(db, bnum, *lines, lines_per_entry=1):
+    """
+    Appends lines to a build's live output stream as a single entry (one SSE event). The
+    stream keeps about `LIVE_OUTPUT_MAX_LINES` lines: it is capped at that many lines divided
+    by `lines_per_entry` entries (the oldest entries are trimmed). It expires
+    `LIVE_OUTPUT_TTL` seconds after the last entry was added. The number of lines, batches
+    (entries) and bytes added are counted in `LIVE_OUTPUT_STATS_KEY`.
+
+    Args:
+        db (redis.StrictRedis): The redis client to use.
+        bnum (int|str): The build's number.
+        *lines (str): The lines to add.
+        lines_per_entry (int): The (maximum) number of lines in each of the stream's entries
+                               (eg. the batch size of a `LiveOutputPublisher`).
+
+    """
+
+    if not lines:
+        return
+
+    key = get_live_output_key(bnum)
+    data = '\n'.join(lines)
+    max_entries = max(1, LIVE_OUTPUT_MAX_LINES // lines_per_entry)
+    pipe = db.pipeline(transaction=False)
+
+    pipe.execute_command('XADD', key, 'MAXLEN', '~', max_entries, '*', 'lines', data)
+    pipe.expire(key, LIVE_OUTPUT_TTL)
+    pipe.hincrby(LIVE_OUTPUT_STATS_KEY, 'lines', len(lines))
+    pipe.hincrby(LIVE_OUTPUT_STATS_KEY, 'batches', 1)
+    pipe.hincrby(LIVE_OUTPUT_STATS_KEY, 'bytes', len(data.encode('UTF-8')))
+    pipe.execute()
+
+
+def get_live_output_stats(db):
+    stats = db.hgetall(LIVE_OUTPUT_STATS_KEY)
+    return {name: int(stats.get(name, 0)) for name in ('lines', 'batches', 'bytes')}
+
+
 def all_file_paths_exist(paths):
     return not any(True for p in paths if not os.path.exists(p))
 
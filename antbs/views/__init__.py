@@ -27,6 +27,7 @@
 #  along with AntBS; If not, see <http://www.gnu.org/licenses/>.
 
 import gevent
+import itertools
 import json
 import os
 from glob import glob
@@ -59,12 +60,20 @@ from jinja2 import TemplateNotFound
 
 from database import (
     get_pkg_object,
+    get_pkg_objects,
     get_repo_object,
     get_build_object,
+    get_build_objects,
     status,
     get_timeline_object,
+    get_timeline_objects,
     get_trans_object,
+    queue_transaction,
+    clear_transaction_queue,
+    get_transaction_wait_stats,
     db,
+    LiveOutputHub,
+    RedisDataRedisObject,
     get_monitor_object,
     check_repos_for_changes
 )
@@ -182,10 +191,10 @@ def datetime_older_than_days(dt, days=364):
 
 def get_build_history_chart_data(pkg_obj=None):
     if pkg_obj is None:
-        builds = status.completed + status.failed
+        builds = itertools.chain(status.completed.iter_chunks(), status.failed.iter_chunks())
         chart_data = db.get('antbs:misc:charts:home:heatmap') or False
     else:
-        builds = pkg_obj.builds
+        builds = pkg_obj.builds.iter_chunks()
         chart_data = pkg_obj.heat_map
         if chart_data and '_' != chart_data:
             chart_data = json.loads(chart_data)
@@ -198,9 +207,11 @@ def get_build_history_chart_data(pkg_obj=None):
 
     if not chart_data or chart_data in ['[]', '_']:
         chart_data = dict()
-        builds = [b for b in builds if b]
-        for bld in builds:
-            bld_obj = get_build_object(bnum=bld)
+        bld_objs = itertools.chain.from_iterable(
+            get_build_objects(chunk, fields=['end_str']) for chunk in builds
+        )
+
+        for bld_obj in bld_objs:
             if not bld_obj.end_str:
                 continue
 
@@ -29,38 +29,27 @@
 from . import *
 
 EMPTY_RESPONSE = json.dumps({})
+live_output_hub = LiveOutputHub()
 
 
 class APIView(FlaskView):
     route_base = '/api'
 
-    def _get_live_build_output(self, bnum):
-        psub = db.pubsub()
-        psub.subscribe('live:build_output:{0}'.format(bnum))
-        last_line_key = 'tmp:build_log_last_line:{0}'.format(bnum)
-        first_run = True
-        keep_alive = 0
-
-        while True:
-            message = psub.get_message()
-
-            if message:
-                if first_run:
-                    message['data'] = db.get(last_line_key)
-                    first_run = False
+    def _get_live_build_output(self, bnum, last_event_id=None):
+        key = get_live_output_key(bnum)
+        tpl = 'id: {0}\nevent: build_output\n{1}\n\n'
 
-                if message['data'] not in ['1', 1]:
-                    tpl = 'event: build_output\ndata: {0}\n\n'
-                    yield tpl.format(message['data']).encode('UTF-8')
-
-            elif keep_alive > 560:
-                keep_alive = 0
+        for entry in live_output_hub.follow(key, last_event_id, keep_alive=28):
+            if entry is None:
                 yield ':'.encode('UTF-8')
+                continue
 
-            keep_alive += 1
-            gevent.sleep(.05)
+            # An entry holds a batch of lines. Each one gets its own data field so that they
+            # arrive as a single event (the client receives them joined with newlines).
+            entry_id, lines = entry
+            data = '\n'.join('data: {0}'.format(line) for line in lines.split('\n'))
 
-        psub.close()
+            yield tpl.format(entry_id, data).encode('UTF-8')
 
     def _get_live_status_updates(self):
         last_event = None
@@ -188,12 +177,21 @@ class APIView(FlaskView):
                 if 'cnchi-dev' == pkgnames[0]:
                     db.set('CNCHI-DEV-OVERRIDE', True)
 
-                trans = get_trans_object(packages=list(set(pkgnames)), repo_queue=repo_queue)
-                status.transaction_queue.rpush(trans.tnum)
-                transaction_queue.enqueue_call(handle_hook, timeout=84600)
-                get_timeline_object(
-                    msg='<strong>%s</strong> added <strong>%s</strong> to the build queue.' % (
-                        dev, ' '.join(pkgnames)), tl_type=0)
+                trans, coalesced = queue_transaction(
+                    list(set(pkgnames)), priority='interactive', repo_queue=repo_queue
+                )
+
+                if trans is not None:
+                    transaction_queue.enqueue_call(handle_hook, timeout=84600)
+
+                msg = '<strong>%s</strong> added <strong>%s</strong> to the build queue.' % (
+                    dev, ' '.join(pkgnames))
+
+                if coalesced:
+                    msg += ' (%s of them merged into builds that were already queued.)' % len(
+                        coalesced)
+
+                get_timeline_object(msg=msg, tl_type=0)
             else:
                 flash(
                     'Package not found. Has the PKGBUILD been pushed to github?',
@@ -222,11 +220,8 @@ class APIView(FlaskView):
                 transaction_queue.empty()
             if repo_queue.count > 0:
                 repo_queue.empty()
-            items = len(status.transaction_queue)
-            if items > 0:
-                for item in range(items):
-                    popped = status.transaction_queue.rpop()
-                    logger.debug(popped)
+            popped = clear_transaction_queue()
+            logger.debug(popped)
             status.idle = True
             status.current_status = 'Idle.'
 
@@ -242,13 +237,26 @@ class APIView(FlaskView):
                 _ = {}
                 for pkg in pkgs:
                     _[pkg] = get_pkg_object(pkg, fetch_pkgbuild=True)
-                tobj = get_trans_object(pkgs, repo_queue=repo_queue)
+                shas = {}
 
                 if old_tobj:
-                    tobj.gh_sha_before, tobj.gh_sha_after = old_tobj.gh_sha_before, old_tobj.gh_sha_after
+                    shas = dict(
+                        gh_sha_before=old_tobj.gh_sha_before,
+                        gh_sha_after=old_tobj.gh_sha_after
+                    )
+
+                # The old commits aren't the newest, so they must not replace the commits of a
+                # queued transaction that the packages are merged into.
+                tobj, _ = queue_transaction(
+                    list(pkgs),
+                    priority='interactive',
+                    repo_queue=repo_queue,
+                    update_merged_shas=False,
+                    **shas
+                )
 
-                status.transaction_queue.rpush(tobj.tnum)
-                transaction_queue.enqueue_call(handle_hook, timeout=84600)
+                if tobj is not None:
+                    transaction_queue.enqueue_call(handle_hook, timeout=84600)
 
         elif update_repos:
             repo_queue.enqueue_call(update_repo_databases, timeout=9600)
@@ -270,7 +278,7 @@ class APIView(FlaskView):
         }
 
         return Response(
-            self._get_live_build_output(bnum),
+            self._get_live_build_output(bnum, request.headers.get('Last-Event-ID')),
             direct_passthrough=True,
             mimetype='text/event-stream',
             headers=headers
@@ -289,6 +297,61 @@ class APIView(FlaskView):
             headers=headers
         )
 
+    @route('/build/<int:bnum>/log')
+    def get_log_lines(self, bnum=None):
+        bld_obj = get_build_object(bnum=bnum)
+
+        if not bld_obj:
+            abort(404)
+
+        total = bld_obj.get_log_length()
+        start = max(0, request.args.get('from', 0, type=int))
+        stop = min(request.args.get('to', total, type=int), total, start + 10000)
+
+        return json.dumps(dict(
+            start=start,
+            stop=max(start, stop),
+            total=total,
+            lines=bld_obj.get_log_lines(start, stop) if stop > start else []
+        ))
+
+    @route('/build/<int:bnum>/log/highlighted')
+    def get_highlighted_log(self, bnum=None):
+        bld_obj = get_build_object(bnum=bnum)
+
+        if not bld_obj:
+            abort(404)
+
+        total = bld_obj.get_log_length()
+        start = request.args.get('from', 0, type=int)
+        stop = request.args.get('to', start + bld_obj.log_page_size, type=int)
+        start = max(0, min(start, total))
+        stop = max(start, min(stop, total, start + bld_obj.log_page_size))
+
+        return json.dumps(dict(
+            start=start,
+            stop=stop,
+            total=total,
+            html=bld_obj.get_highlighted_log(start, stop) if stop > start else ''
+        ))
+
+    @route('/cache_stats')
+    @auth_required
+    def cache_stats(self):
+        stats = dict(
+            pid=os.getpid(),
+            child_objects=RedisDataRedisObject.cache_stats(),
+            live_output_subscriptions=live_output_hub.stats(),
+            live_output_published=get_live_output_stats(db)
+        )
+
+        return json.dumps(stats)
+
+    @route('/queue_stats')
+    @auth_required
+    def queue_stats(self):
+        return json.dumps(get_transaction_wait_stats())
+
     @route('/hook', methods=['POST', 'GET'])
     def hook(self):
         hook = Webhook(request)
@@ -69,14 +69,11 @@ class BuildView(FlaskView):
 
         if all_builds:
             builds, all_pages = get_paginated(all_builds, 10, page)
-            for bnum in builds:
-                try:
-                    bld_obj = get_build_object(bnum=bnum)
-                except Exception as err:
-                    logger.error(err)
-                    continue
 
-                builds_list.append(bld_obj)
+            try:
+                builds_list = get_build_objects(builds)
+            except Exception as err:
+                logger.error(err)
 
             if current_user.is_authenticated:
                 for bld_obj in builds_list:
@@ -123,11 +120,16 @@ class BuildView(FlaskView):
 
         try:
             bld_obj = get_build_object(bnum=bnum)
+            bld_obj.load_snapshot()
         except Exception:
             abort(500)
 
-        if not bld_obj.log_str:
-            bld_obj.log_str = 'Unavailable'
+        log_total = bld_obj.get_log_length()
+
+        if log_total:
+            log_html = bld_obj.get_highlighted_log(0, bld_obj.log_page_size)
+        else:
+            log_html = bld_obj.log_str or 'Unavailable'
 
         if bld_obj.container:
             container = bld_obj.container[:20]
@@ -140,7 +142,9 @@ class BuildView(FlaskView):
             'build/build_info.html',
             bld_obj=bld_obj,
             container=container,
-            result=result
+            result=result,
+            log_html=log_html,
+            log_total=log_total
         )
 
 
@@ -33,11 +33,7 @@ class HomeView(FlaskView):
     route_base = '/'
 
     def _get_timeline(self, tlpage=1):
-        timeline = []
-
-        for event_id in status.all_tl_events[-250:-1]:
-            event = get_timeline_object(event_id=event_id)
-            timeline.append(event)
+        timeline = get_timeline_objects(status.all_tl_events[-250:-1])
 
         this_page, all_pages = get_paginated(timeline, 6, tlpage)
 
@@ -88,21 +84,16 @@ class HomeView(FlaskView):
         for stat in check_stats:
             builds = getattr(status, stat)
             res = len(builds) or '0'
-            builds = [x for x in builds[1500:-1] if x]
             within = []
-            for bnum in builds:
-                try:
-                    bld_obj = get_build_object(bnum=bnum)
-                except (ValueError, AttributeError):
-                    continue
-
-                end = ''
-                if bld_obj.end_str:
-                    end = datetime.strptime(bld_obj.end_str, '%m/%d/%Y %I:%M%p')
-                    end = end if (datetime.now() - end) < timedelta(hours=48) else ''
-
-                if end:
-                    within.append(bld_obj.bnum)
+            for chunk in builds.iter_chunks(start=1500):
+                for bld_obj in get_build_objects(chunk, fields=['bnum', 'end_str']):
+                    end = ''
+                    if bld_obj.end_str:
+                        end = datetime.strptime(bld_obj.end_str, '%m/%d/%Y %I:%M%p')
+                        end = end if (datetime.now() - end) < timedelta(hours=48) else ''
+
+                    if end:
+                        within.append(bld_obj.bnum)
 
             stats[stat] = len(within)
 
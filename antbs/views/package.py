@@ -33,24 +33,19 @@ class PackageView(FlaskView):
     route_base = '/package'
 
     def _get_build_events_timeline(self, pkg_obj, tlpage=1):
-        timeline = []
         start_at = len(pkg_obj.tl_events) - 300
         start_at = max(0, start_at)
-
-        for event_id in pkg_obj.tl_events[start_at:-1]:
-            event = get_timeline_object(event_id=event_id)
-            timeline.append(event)
+        timeline = get_timeline_objects(pkg_obj.tl_events[start_at:-1])
 
         this_page, all_pages = get_paginated(timeline, 6, tlpage)
 
         return this_page, all_pages
 
     def _get_build_counts(self, pkg_obj):
-        completed = [b for b in pkg_obj.builds if b and not build_failed(b)]
-        failed = [b for b in pkg_obj.builds if b and build_failed(b)]
+        bld_objs = get_build_objects(pkg_obj.builds, fields=['failed'])
 
-        completed = len(completed)
-        failed = len(failed)
+        failed = len([bld_obj for bld_obj in bld_objs if bld_obj.failed])
+        completed = len(bld_objs) - failed
 
         counts = [
             ('Total Builds', completed + failed, ''),
@@ -67,6 +62,7 @@ class PackageView(FlaskView):
             abort(404)
 
         pkg_obj = get_pkg_object(name=pkgname)
+        pkg_obj.load_snapshot()
 
         if '' == pkg_obj.description:
             desc = pkg_obj.get_from_pkgbuild('pkgdesc')
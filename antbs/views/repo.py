@@ -45,7 +45,6 @@ class RepoView(FlaskView):
                 abort(404)
 
         pkgs = []
-        bld_obj = None
         all_pages = 0
         repo_obj = get_repo_object(repo_name, 'x86_64')
 
@@ -73,25 +72,30 @@ class RepoView(FlaskView):
             repo_packages = [p for p in sorted(repo_obj.pkgnames)]
 
         packages, all_pages = get_paginated(repo_packages, 10, page, reverse=False)
+        packages = [p for p in packages if 'dummy' not in p and 'grub-zfs' not in p]
 
-        for pkg in packages:
-            if 'dummy' in pkg or 'grub-zfs' in pkg:
-                continue
+        try:
+            pkg_objs = get_pkg_objects(packages)
+        except Exception as err:
+            logger.error(err)
+            return pkgs, rev_pending, all_pages
 
-            try:
-                pkg_obj = get_pkg_object(pkg)
-            except Exception as err:
-                logger.error(err)
-                continue
+        last_builds = {}
 
+        for pkg_obj in pkg_objs:
             try:
-                bnum = pkg_obj.builds[-1]
-                if bnum:
-                    bld_obj = get_build_object(bnum=bnum)
+                last_builds[pkg_obj.pkgname] = pkg_obj.builds[-1]
             except Exception:
                 continue
 
-            pkg_obj._build = bld_obj
+        bnums = [bnum for bnum in last_builds.values() if bnum]
+        bld_objs = {bld_obj.bnum: bld_obj for bld_obj in get_build_objects(bnums)}
+
+        for pkg_obj in pkg_objs:
+            if pkg_obj.pkgname not in last_builds:
+                continue
+
+            pkg_obj._build = bld_objs.get(last_builds[pkg_obj.pkgname])
             pkgs.append(pkg_obj)
 
         return pkgs, rev_pending, all_pages
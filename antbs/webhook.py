@@ -49,7 +49,7 @@ from database import (
     AntergosInstallationUser,
     get_timeline_object,
     status,
-    get_trans_object,
+    queue_transaction,
     bool_string_helper
 )
 
@@ -367,26 +367,42 @@ class Webhook(WebhookMeta):
                     source = 'Github'
                     tltype = 1
 
-                trans_obj = get_trans_object(packages=the_pkgs)
                 initiated_by = 'RepoMonitor' if (self.is_monitor or self.is_numix) else 'Github'
-                trans_obj.initiated_by = initiated_by
-                trans_obj.sync_pkgbuilds_only = self.sync_pkgbuilds_only
-                trans_obj.gh_sha_before = self.payload['before']
-                trans_obj.gh_sha_after = self.payload['after']
+                trans_obj, coalesced = queue_transaction(
+                    the_pkgs,
+                    priority='monitor' if 'RepoMonitor' == initiated_by else 'webhook',
+                    initiated_by=initiated_by,
+                    sync_pkgbuilds_only=self.sync_pkgbuilds_only,
+                    gh_sha_before=self.payload['before'],
+                    gh_sha_after=self.payload['after']
+                )
 
                 the_pkgs_str = ''.join(html)
-                tl_event = get_timeline_object(msg=tpl.format(source, the_pkgs_str),
+                msg = tpl.format(source, the_pkgs_str)
+
+                if coalesced:
+                    msg += ' ({0} of them merged into builds that were already queued.)'.format(
+                        len(coalesced)
+                    )
+
+                if trans_obj is not None:
+                    tnum = trans_obj.tnum
+                else:
+                    # All of them were merged: link the transaction they were merged into.
+                    tnum = next(iter(coalesced.values()))
+
+                tl_event = get_timeline_object(msg=msg,
                                                tl_type=tltype,
                                                packages=the_pkgs,
-                                               tnum=trans_obj.tnum)
+                                               tnum=tnum)
 
                 p_objs = [get_pkg_object(name=p, fetch_pkgbuild=True) for p in the_pkgs]
 
                 for p_obj in p_objs:
                     p_obj.tl_events.append(tl_event.event_id)
 
-                status.transaction_queue.append(trans_obj.tnum)
-                queue.enqueue_call(builder.handle_hook, timeout=84600)
+                if trans_obj is not None:
+                    queue.enqueue_call(builder.handle_hook, timeout=84600)
 
             if not self.result:
                 self.result = json.dumps({'msg': 'OK!'})
@@ -0,0 +1,17 @@
+import os
+import sys
+import types
+
+ANTBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'antbs')
+
+# The application's modules import each other as top-level packages (eg. `utils`).
+sys.path.insert(0, ANTBS_DIR)
+
+# Importing `database` connects to redis and docker (in `database/__init__`). The modules that
+# are tested on their own (eg. `database.build_log`) only need the package's redis clients,
+# which the tests replace, so they are loaded from a bare package instead.
+if 'database' not in sys.modules:
+    database = types.ModuleType('database')
+    database.__path__ = [os.path.join(ANTBS_DIR, 'database')]
+    database.db = database.binary_db = None
+    sys.modules['database'] = database
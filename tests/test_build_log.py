@@ -0,0 +1,86 @@
+import pytest
+
+from database.build_log import CompressedLog, LogArchive
+
+LINES = ['line {0} {1}'.format(num, 'x' * (num % 7)) for num in range(200)]
+RANGES = [(0, None), (0, 1), (5, 17), (37, 38), (150, 200), (190, 500), (199, None), (50, 50),
+          (300, None)]
+
+
+@pytest.fixture
+def compressed_log(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    monkeypatch.setattr(CompressedLog, 'db', fakeredis.FakeStrictRedis())
+
+    return CompressedLog('antbs:build:1:compressed_log', chunk_size=64)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return LogArchive(directory=str(tmp_path), chunk_size=64)
+
+
+def test_compressed_log_range_reads(compressed_log):
+    compressed_log.write(LINES)
+
+    assert compressed_log
+    assert len(compressed_log) == len(LINES)
+    assert list(compressed_log) == LINES
+
+    for start, stop in RANGES:
+        assert compressed_log.get_lines(start, stop) == LINES[start:stop]
+
+
+def test_compressed_log_replaces_lines(compressed_log):
+    compressed_log.write(LINES)
+    compressed_log.write(LINES[:3])
+
+    assert compressed_log.get_lines() == LINES[:3]
+
+
+def test_compressed_log_is_not_replaced_when_writing_fails(compressed_log):
+    compressed_log.write(LINES[:10])
+
+    with pytest.raises(RuntimeError):
+        with compressed_log.writer() as writer:
+            writer.add('new line')
+            raise RuntimeError
+
+    assert compressed_log.get_lines() == LINES[:10]
+
+
+def test_empty_compressed_log(compressed_log):
+    assert not compressed_log
+    assert len(compressed_log) == 0
+    assert compressed_log.get_lines() == []
+
+
+def test_deleted_compressed_log(compressed_log):
+    compressed_log.write(LINES)
+    compressed_log.delete()
+
+    assert not compressed_log
+    assert compressed_log.get_lines() == []
+
+
+def test_log_archive_range_reads(archive):
+    archive.write(1234, LINES)
+
+    assert archive.exists(1234)
+    assert archive.get_length(1234) == len(LINES)
+
+    for start, stop in RANGES:
+        assert archive.get_lines(1234, start, stop) == LINES[start:stop]
+
+
+def test_log_archive_replaces_logs(archive):
+    archive.write(1234, LINES)
+    archive.write(1234, LINES[:3])
+
+    assert archive.get_lines(1234) == LINES[:3]
+
+
+def test_missing_archived_log(archive):
+    assert not archive.exists(1)
+    assert archive.get_length(1) == 0
+    assert archive.get_lines(1) == []
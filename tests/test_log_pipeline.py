@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from utils.log_pipeline import add_timestamps, decode_lines, dedupe, fan_out, strip_ansi
+
+
+def test_decode_lines_joins_characters_split_across_chunks():
+    # 'é' is two bytes in UTF-8 (0xc3 0xa9).
+    chunks = [b'caf\xc3', b'\xa9\nna', b'\xc3', b'\xafve\n']
+
+    assert list(decode_lines(chunks)) == ['café', 'naïve']
+
+
+def test_decode_lines_splits_long_lines():
+    chunks = [b'abcdefghij\n', b'klmnopq', b'rstu', b'v\n\n']
+
+    assert list(decode_lines(chunks, max_line_length=4)) == [
+        'abcd', 'efgh', 'ij', 'klmn', 'opqr', 'stuv', ''
+    ]
+
+
+def test_decode_lines_yields_trailing_partial_line():
+    assert list(decode_lines([b'one\ntw', b'o'])) == ['one', 'two']
+    assert list(decode_lines([b'one\n', b'x\xc3'])) == ['one', 'x�']
+
+
+def test_strip_ansi():
+    assert list(strip_ansi(['\x1b[1;32mok\x1b[0m  '])) == ['ok']
+
+
+def test_dedupe_forgets_lines_outside_of_the_window():
+    assert list(dedupe(['a', 'b', 'a', 'c', 'a'], window=2)) == ['a', 'b', 'c']
+    assert list(dedupe(['a', 'b', 'c', 'a'], window=2)) == ['a', 'b', 'c', 'a']
+    assert list(dedupe(['a', 'b', 'c', 'b'], window=2)) == ['a', 'b', 'c']
+
+
+def test_dedupe_key():
+    assert list(dedupe(['x 1', 'x 2', 'y 1'], key=lambda line: line[0])) == ['x 1', 'y 1']
+
+
+def test_add_timestamps_formats_once_per_minute_of_the_clock():
+    times = iter([
+        datetime(2017, 1, 1, 10, 0, 1),
+        datetime(2017, 1, 1, 10, 0, 59),
+        datetime(2017, 1, 1, 10, 1, 5),
+    ])
+
+    lines = add_timestamps(['a', 'b', 'c'], fmt='%H:%M:%S', clock=lambda: next(times))
+
+    assert list(lines) == ['[10:00:01]: a', '[10:00:01]: b', '[10:01:05]: c']
+
+
+def test_fan_out_passes_every_line_to_every_sink():
+    first, second = [], []
+
+    assert fan_out(iter(['a', 'b', 'c']), first.append, second.append) == 3
+    assert first == second == ['a', 'b', 'c']
+    assert fan_out([]) == 0
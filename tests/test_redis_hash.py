@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from database.base_objects import RedisHash, RedisObject, _redis_data
+from database.base_objects.redis_hash import _CREATE_OBJECT_SCRIPT
+
+
+class Event(RedisHash):
+
+    attrib_lists = dict(
+        string=['message', 'log_key'],
+        int=['event_id'],
+        bool=[],
+        list=['packages'],
+        set=[],
+        path=[]
+    )
+
+
+class Monitor(RedisHash):
+
+    attrib_lists = dict(
+        string=['name'],
+        int=[],
+        bool=['checked_recently'],
+        list=[],
+        set=[],
+        path=[]
+    )
+    can_expire = ['checked_recently']
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+
+    fake_db = fakeredis.FakeStrictRedis(decode_responses=True)
+    monkeypatch.setattr(_redis_data, 'db', fake_db)
+    monkeypatch.setattr(RedisObject, 'db', fake_db)
+
+    return fake_db
+
+
+@pytest.fixture
+def fake_scripts(fake_db, monkeypatch):
+    pytest.importorskip('lupa')
+    monkeypatch.setattr(RedisHash, '_create_object', fake_db.register_script(_CREATE_OBJECT_SCRIPT))
+
+
+def create_event(**kwargs):
+    return Event.create_object(
+        full_key='antbs:event:{id}',
+        id_field='event_id',
+        counter_key='antbs:misc:event_id:next',
+        **kwargs
+    )
+
+
+def test_create_object_fills_in_the_id_of_the_key_and_templated_fields_only(fake_db, fake_scripts):
+    message = 'hello {id} /pkg/x 100% %d %1'
+    event_id, created = create_event(
+        fields=dict(message=message, log_key='log:{id}:{id}'),
+        children=dict(packages=['x']),
+        templated_fields=['log_key'],
+    )
+
+    assert created
+    assert fake_db.hgetall('antbs:event:{0}'.format(event_id)) == dict(
+        event_id=event_id,
+        message=message,
+        log_key='log:{0}:{0}'.format(event_id),
+    )
+    assert fake_db.lrange('antbs:event:{0}:packages'.format(event_id), 0, -1) == ['x']
+
+
+def test_create_object_allocates_a_new_id_each_time(fake_db, fake_scripts):
+    first, _ = create_event(fields=dict(message='a'))
+    second, _ = create_event(fields=dict(message='b'))
+
+    assert int(second) == int(first) + 1
+    assert fake_db.hget('antbs:event:{0}'.format(second), 'message') == 'b'
+
+
+def test_expiring_fields_are_stored_in_their_own_keys(fake_db):
+    monitor = Monitor(prefix='monitor', key='1')
+    monitor.checked_recently = (True, 600)
+
+    assert monitor.checked_recently is True
+    assert 0 < fake_db.ttl('antbs:monitor:1:checked_recently') <= 600
+    assert not fake_db.hexists('antbs:monitor:1', 'checked_recently')
+
+
+def test_expiring_fields_stored_in_the_hash_are_moved_to_their_own_keys(fake_db):
+    fake_db.hmset('antbs:monitor:1', {
+        'name': 'antergos',
+        'checked_recently': 'True',
+        'checked_recently__exp': int(time.time()) + 600,
+    })
+    monitor = Monitor(prefix='monitor', key='1')
+
+    assert monitor.checked_recently is True
+    assert 0 < fake_db.ttl('antbs:monitor:1:checked_recently') <= 600
+    assert fake_db.hgetall('antbs:monitor:1') == {'name': 'antergos'}
+
+
+def test_expired_fields_stored_in_the_hash_are_removed(fake_db):
+    fake_db.hmset('antbs:monitor:1', {
+        'name': 'antergos',
+        'checked_recently': 'True',
+        'checked_recently__exp': int(time.time()) - 1,
+    })
+    monitor = Monitor(prefix='monitor', key='1')
+
+    assert monitor.checked_recently is False
+    assert not fake_db.exists('antbs:monitor:1:checked_recently')
+    assert fake_db.hgetall('antbs:monitor:1') == {'name': 'antergos'}
+
+
+def test_delete_removes_the_keys_of_expiring_fields(fake_db):
+    monitor = Monitor(prefix='monitor', key='1')
+    monitor.name = 'antergos'
+    monitor.checked_recently = (True, 600)
+    monitor.delete()
+
+    assert not fake_db.exists('antbs:monitor:1')
+    assert not fake_db.exists('antbs:monitor:1:checked_recently')